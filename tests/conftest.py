@@ -37,3 +37,17 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+import pytest
+from django.test import override_settings
+
+from core.testing import isolated_caches
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_site_state():
+    # Процессы пула миниатюр загрузили бы рабочие настройки и писали бы в
+    # рабочие БД и кэш, поэтому миниатюры режутся в процессе тестов.
+    with isolated_caches(), override_settings(THUMBNAIL_WORKERS=0):
+        yield
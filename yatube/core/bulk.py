@@ -0,0 +1,34 @@
+"""Помощники для массовой записи через bulk_create в обход save()."""
+from contextlib import contextmanager
+
+from django.core.management.color import no_style
+from django.db import connection
+
+
+@contextmanager
+def original_pub_dates(*models):
+    """Отключает auto_now_add у pub_date, чтобы даты задавал вызывающий."""
+    fields = [model._meta.get_field('pub_date') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def reset_sequences(*models):
+    """Сдвигает последовательности id после вставки с явными id (нужно
+    PostgreSQL; SQLite берёт следующий id из таблицы)."""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def batch_size(model, rows, requested):
+    """batch_size для bulk_create не больше, чем пропустит база: Django 2.2
+    не урезает явно заданный размер до предела параметров SQLite."""
+    return min(requested, connection.ops.bulk_batch_size(
+        model._meta.concrete_fields, rows))
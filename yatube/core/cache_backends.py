@@ -0,0 +1,230 @@
+"""Двухуровневый кэш: LRU в памяти процесса перед общим кэшем.
+
+Общий уровень (L2) — другой кэш из CACHES, указанный в LOCATION, например
+FileBasedCache: его видят все воркеры, и запись или инвалидация в одном
+сразу доходит до остальных. Локальный уровень (L1) держит не больше
+MAX_ENTRIES последних прочитанных значений.
+
+Каждая запись в L1 помнит поколение своей корзины ключей, хранящееся в L2.
+Любая запись в L2 меняет поколение корзины, поэтому чтение из L1 стоит
+одного маленького чтения поколения вместо чтения и распаковки значения.
+
+SharedFileCache — файловый L2 для такой связки: add и incr в нём атомарны
+между процессами, а incr не сбрасывает срок жизни ключа.
+"""
+import os
+import pickle
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+GENERATION_PREFIX = 'l1_generation:'
+
+_missing = object()
+
+
+class TwoLevelCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._l1_timeout = options.get('L1_TIMEOUT', 60)
+        self._buckets = options.get('GENERATION_BUCKETS', 256)
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _generation_key(self, local_key):
+        bucket = zlib.crc32(local_key.encode()) % self._buckets
+        return f'{GENERATION_PREFIX}{bucket}'
+
+    def _generations(self, local_keys):
+        generation_keys = {self._generation_key(key) for key in local_keys}
+        generations = self.shared.get_many(generation_keys)
+        for generation_key in generation_keys - generations.keys():
+            self.shared.add(generation_key, uuid.uuid4().hex, None)
+            generations[generation_key] = self.shared.get(generation_key)
+        return generations
+
+    def _bump(self, local_keys):
+        # Случайный токен вместо incr: два параллельных сдвига не
+        # сольются в одно значение.
+        self.shared.set_many({
+            self._generation_key(key): uuid.uuid4().hex for key in local_keys
+        }, None)
+        with self._lock:
+            for key in local_keys:
+                self._l1.pop(key, None)
+
+    def _recall(self, local_key, generation):
+        with self._lock:
+            item = self._l1.get(local_key)
+            if item is None:
+                return _missing
+            if item[0] == generation and item[1] > time.monotonic():
+                self._l1.move_to_end(local_key)
+                # Распаковываем копию, как LocMemCache: вызывающий
+                # может менять объект, например HttpResponse.
+                return pickle.loads(item[2])
+            del self._l1[local_key]
+            return _missing
+
+    def _remember(self, local_key, generation, value, timeout):
+        if timeout is None or timeout > self._l1_timeout:
+            timeout = self._l1_timeout
+        item = (generation, time.monotonic() + timeout,
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            self._l1[local_key] = item
+            self._l1.move_to_end(local_key)
+            while len(self._l1) > self._max_entries:
+                self._l1.popitem(last=False)
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        generation = self._generations([local_key])[
+            self._generation_key(local_key)]
+        value = self._recall(local_key, generation)
+        if value is not _missing:
+            return value
+        value = self.shared.get(key, _missing, version=version)
+        if value is _missing:
+            return default
+        self._remember(local_key, generation, value, self._l1_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        """Поколения и промахи L1 читаются из L2 одним get_many каждые."""
+        local_keys = {key: self.make_key(key, version=version) for key in keys}
+        for local_key in local_keys.values():
+            self.validate_key(local_key)
+        generations = self._generations(local_keys.values())
+        found, missing = {}, []
+        for key, local_key in local_keys.items():
+            value = self._recall(
+                local_key, generations[self._generation_key(local_key)])
+            if value is _missing:
+                missing.append(key)
+            else:
+                found[key] = value
+        fetched = self.shared.get_many(missing, version=version)
+        for key, value in fetched.items():
+            local_key = local_keys[key]
+            self._remember(
+                local_key, generations[self._generation_key(local_key)],
+                value, self._l1_timeout)
+        found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version=version)
+        timeout = self._timeout(timeout)
+        self.shared.set(key, value, timeout, version=version)
+        self._bump([local_key])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(
+            data, self._timeout(timeout), version=version)
+        self._bump([self.make_key(key, version=version) for key in data])
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version=version)
+        added = self.shared.add(key, value, self._timeout(timeout),
+                                version=version)
+        if added:
+            self._bump([local_key])
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._bump([self.make_key(key, version=version)])
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, self._timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self.shared.delete(key, version=version)
+        self._bump([self.make_key(key, version=version)])
+
+    def has_key(self, key, version=None):
+        return self.get(key, _missing, version=version) is not _missing
+
+    def clear(self):
+        # Поколения в L2 удаляются вместе с данными, и у других
+        # процессов их L1-записи перестают совпадать.
+        self.shared.clear()
+        with self._lock:
+            self._l1.clear()
+
+
+class SharedFileCache(FileBasedCache):
+    """FileBasedCache с атомарными add и incr для нескольких процессов.
+
+    add и incr берут блокировку файла-полосы, выбранной по ключу. Размер
+    каталога проверяется раз в CULL_INTERVAL записей: листинг стоит O(N),
+    так что MAX_ENTRIES здесь мягкий предел.
+    """
+
+    lock_suffix = '.lock'
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        options = params.get('OPTIONS', {})
+        self._lock_stripes = options.get('LOCK_STRIPES', 64)
+        self._cull_interval = options.get('CULL_INTERVAL', 100)
+        self._writes = 0
+
+    @contextmanager
+    def _key_lock(self, fname):
+        self._createdir()
+        stripe = zlib.crc32(os.path.basename(fname).encode())
+        path = os.path.join(
+            self._dir, f'{stripe % self._lock_stripes}{self.lock_suffix}')
+        with open(path, 'ab') as lock_file:
+            locks.lock(lock_file, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(lock_file)
+
+    def _cull(self):
+        self._writes += 1
+        if self._writes % self._cull_interval == 0:
+            super()._cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._key_lock(self._key_to_file(key, version)):
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        fname = self._key_to_file(key, version)
+        with self._key_lock(fname):
+            try:
+                with open(fname, 'rb') as f:
+                    expiry = pickle.load(f)
+                    value = pickle.loads(zlib.decompress(f.read()))
+            except (FileNotFoundError, EOFError):
+                expiry = value = None
+            timeout = None if expiry is None else expiry - time.time()
+            if value is None or (timeout is not None and timeout <= 0):
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            self.set(key, value, timeout, version)
+        return value
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 
 
 class PubDateModel(models.Model):
@@ -10,3 +10,15 @@ class PubDateModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class AtomicSaveModel(models.Model):
+    """Абстрактная модель. Сохраняет запись и обработчики post_save
+    (например, счётчики) в одной транзакции."""
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
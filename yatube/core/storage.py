@@ -0,0 +1,100 @@
+"""Хранилище файлов, адресуемых по содержимому.
+
+Файл хэшируется SHA-256 по мере записи во временный файл и сохраняется
+как <каталог>/<2 символа хэша>/<хэш><расширение>. Повторная загрузка того
+же содержимого не пишет новый файл, а возвращает имя уже лежащего, так
+что одинаковые файлы хранятся и обрабатываются один раз.
+
+Один файл могут использовать несколько записей, поэтому удалять его
+можно, только когда ссылок на него не осталось (см. posts.blobs). Выбор
+между записью нового файла и обновлением уже лежащего идёт под lock(),
+который берёт и сборщик мусора перед удалением.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import zlib
+from contextlib import contextmanager
+
+from django.core.files import locks
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def is_blob(name):
+    """Лежит ли файл под именем из хэша содержимого."""
+    return bool(BLOB_RE.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    lock_directory = '.locks'
+    lock_stripes = 64
+
+    @contextmanager
+    def lock(self, name):
+        """Блокировка файла name между процессами (файл-полоса по хэшу)."""
+        directory = self.path(self.lock_directory)
+        os.makedirs(directory, exist_ok=True)
+        stripe = zlib.crc32(os.path.basename(name).encode())
+        path = os.path.join(directory, f'{stripe % self.lock_stripes}.lock')
+        with open(path, 'ab') as lock_file:
+            locks.lock(lock_file, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(lock_file)
+
+    def get_available_name(self, name, max_length=None):
+        # Настоящее имя выбирает _save по содержимому, а одинаковое
+        # содержимое и должно попасть в тот же файл.
+        return name
+
+    def _save(self, name, content):
+        directory, basename = os.path.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        incoming = self.path(directory)
+        os.makedirs(incoming, exist_ok=True)
+        hasher = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=incoming, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    temp.write(chunk)
+            digest = hasher.hexdigest()
+            blob_name = '/'.join(
+                part for part in
+                (directory, digest[:2], digest + extension) if part)
+            path = self.path(blob_name)
+            with self.lock(blob_name):
+                if os.path.exists(path):
+                    # Свежая отметка времени бережёт файл от сборщика,
+                    # пока ссылающаяся на него запись не закоммичена.
+                    os.utime(path)
+                    os.unlink(temp_path)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                    os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return blob_name
+
+    def blobs(self, directory=''):
+        """Имена всех файлов-хэшей в каталоге directory."""
+        root = self.path(directory)
+        for current, _, files in os.walk(root):
+            for basename in files:
+                relative = os.path.relpath(
+                    os.path.join(current, basename), self.location)
+                name = relative.replace(os.sep, '/')
+                if is_blob(name):
+                    yield name
@@ -0,0 +1,327 @@
+"""Кэш с инвалидацией по тегам.
+
+Запись кэшируется вместе с версиями своих тегов (например, ``post:1``,
+``author:2``, ``group:3``, ``feed:index``). invalidate() увеличивает
+счётчик версии тега, и все записи с этим тегом перестают совпадать по
+версии, так что TTL можно держать большим без риска отдать устаревшее.
+Если счётчик тега вытеснен из кэша, записи с этим тегом тоже считаются
+устаревшими.
+"""
+import hashlib
+import math
+import random
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from django.views.decorators import http
+
+TAG_PREFIX = 'tag_version:'
+LOCK_PREFIX = 'rebuild_lock:'
+STATS_PREFIX = 'cache_stats:'
+
+# Сколько секунд держится блокировка пересборки страницы.
+lock_timeout: int = 30
+# Сколько ждать чужой пересборки, если старой копии нет.
+wait_timeout: float = 5
+wait_step: float = 0.05
+early_expiry_beta: float = 1.0
+# Сколько секунд процесс копит счётчики stats в памяти, прежде чем
+# записать их в общий кэш.
+stats_flush_interval: float = 10
+
+_pending_stats = Counter()
+_stats_lock = threading.Lock()
+_stats_flushed_at = time.monotonic()
+
+
+def _tag_key(tag):
+    return TAG_PREFIX + tag
+
+
+def _new_version():
+    # Начинаем со времени, а не с единицы, чтобы заново созданный после
+    # вытеснения счётчик не совпал со старой версией.
+    return int(time.time() * 1000)
+
+
+def tag_versions(tags):
+    """Текущие версии тегов одним запросом; отсутствующие создаются."""
+    keys = {_tag_key(tag): tag for tag in tags}
+    stored = cache.get_many(list(keys))
+    versions = {keys[key]: version for key, version in stored.items()}
+    for key, tag in keys.items():
+        if key not in stored:
+            cache.add(key, _new_version(), None)
+            versions[tag] = cache.get(key)
+    return versions
+
+
+def invalidate(*tags):
+    for tag in tags:
+        try:
+            cache.incr(_tag_key(tag))
+        except ValueError:
+            # Счётчика нет — записей с этим тегом тоже нет.
+            pass
+
+
+def invalidate_on_commit(*tags):
+    """Инвалидирует теги сейчас и ещё раз после коммита транзакции, чтобы
+    страница, собранная параллельно до коммита, не осталась в кэше."""
+    invalidate(*tags)
+    transaction.on_commit(lambda: invalidate(*tags))
+
+
+def _is_fresh(entry, current):
+    return all(current.get(_tag_key(tag)) == version
+               for tag, version in entry['tags'].items())
+
+
+def get(key, default=None):
+    entry = cache.get(key)
+    if entry is None:
+        return default
+    current = cache.get_many([_tag_key(tag) for tag in entry['tags']])
+    return entry['value'] if _is_fresh(entry, current) else default
+
+
+def get_many(keys):
+    """Свежие записи из keys: один запрос за записями и один за тегами."""
+    entries = cache.get_many(keys)
+    tag_keys = {
+        _tag_key(tag) for entry in entries.values() for tag in entry['tags']
+    }
+    current = cache.get_many(list(tag_keys)) if tag_keys else {}
+    return {
+        key: entry['value'] for key, entry in entries.items()
+        if _is_fresh(entry, current)
+    }
+
+
+def _entry(value, versions):
+    return {'value': value, 'tags': versions}
+
+
+def put(key, value, tags, timeout=None):
+    cache.set(key, _entry(value, tag_versions(tags)), timeout)
+
+
+def put_many(values, tags, timeout=None):
+    """values: {key: value}, tags: {key: [теги записи]}."""
+    versions = tag_versions({tag for key in values for tag in tags[key]})
+    cache.set_many({
+        key: _entry(value, {tag: versions[tag] for tag in tags[key]})
+        for key, value in values.items()
+    }, timeout)
+
+
+def tag_response(response, *tags):
+    """Помечает ответ тегами, которые станут известны только после
+    рендера (авторы и группы постов на странице)."""
+    response.cache_tags = getattr(response, 'cache_tags', ()) + tags
+    return response
+
+
+def _count(key_prefix, event):
+    # Запись в общий кэш на каждое попадание стоила бы дороже самого
+    # попадания, поэтому счётчики копятся в процессе.
+    with _stats_lock:
+        _pending_stats[f'{STATS_PREFIX}{key_prefix}:{event}'] += 1
+        due = time.monotonic() - _stats_flushed_at >= stats_flush_interval
+    if due:
+        flush_stats()
+
+
+def flush_stats():
+    """Переносит накопленные процессом счётчики stats в общий кэш."""
+    global _stats_flushed_at
+    with _stats_lock:
+        pending = dict(_pending_stats)
+        _pending_stats.clear()
+        _stats_flushed_at = time.monotonic()
+    for key, count in pending.items():
+        if cache.add(key, count, None):
+            continue
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.add(key, count, None)
+
+
+def stats(key_prefix):
+    """Счётчики попаданий, промахов и отданных устаревших копий.
+
+    Другие процессы сбрасывают свои счётчики раз в stats_flush_interval
+    секунд, так что их последние события могут ещё не учитываться.
+    """
+    flush_stats()
+    keys = {event: f'{STATS_PREFIX}{key_prefix}:{event}'
+            for event in ('hit', 'miss', 'stale')}
+    stored = cache.get_many(list(keys.values()))
+    return {event: stored.get(key, 0) for event, key in keys.items()}
+
+
+def _expires_early(entry):
+    # Вероятностное раннее истечение (XFetch): чем дольше собирается
+    # страница и чем ближе срок, тем вероятнее обновить её заранее, чтобы
+    # запись не истекала у всех воркеров разом.
+    gap = -entry['delta'] * early_expiry_beta * math.log(1 - random.random())
+    return time.time() + gap >= entry['expires']
+
+
+def _wait_for_rebuild(lock_key):
+    deadline = time.monotonic() + wait_timeout
+    while cache.get(lock_key) is not None and time.monotonic() < deadline:
+        time.sleep(wait_step)
+
+
+def _reader_id(request):
+    return request.user.pk if request.user.is_authenticated else 0
+
+
+def page_key(request, key_prefix):
+    raw = f'{request.get_full_path()}|{_reader_id(request)}'
+    return f'{key_prefix}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def tags_etag(request, tags):
+    """ETag страницы из версий её тегов: меняется при любой их инвалидации.
+
+    Учитывает читателя и его CSRF-cookie, так как в страницу попадают
+    меню пользователя и токен формы комментария.
+    """
+    versions = tag_versions(tags)
+    parts = [
+        request.get_full_path(),
+        str(_reader_id(request)),
+        request.META.get('CSRF_COOKIE', ''),
+    ]
+    parts.extend(f'{tag}={versions[tag]}' for tag in sorted(versions))
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def _lookup(key, static_tags):
+    """Запись страницы, свежа ли она и текущие версии известных тегов."""
+    entry = cache.get(key)
+    known = set(static_tags)
+    if entry is not None:
+        known.update(entry['tags'])
+    current = tag_versions(known)
+    fresh = entry is not None and all(
+        current[tag] == version for tag, version in entry['tags'].items())
+    return entry, fresh, current
+
+
+def _follow_rebuild(key_prefix, key, entry, fresh, static_tags):
+    """Страницу пересобирает другой запрос: отдаёт старую копию или ждёт
+    его результата. Возвращает ответ (None, если не дождались) и текущие
+    версии тегов."""
+    if entry is not None:
+        _count(key_prefix, 'hit' if fresh else 'stale')
+        response = entry['value']
+        # Версии тегов уже новее этой копии; см. etag().
+        response.stale = not fresh
+        return response, None
+    _wait_for_rebuild(LOCK_PREFIX + key)
+    entry, fresh, current = _lookup(key, static_tags)
+    if fresh:
+        _count(key_prefix, 'hit')
+        return entry['value'], current
+    return None, current
+
+
+def _store_page(key, response, static_versions, started, timeout,
+                stale_timeout):
+    if (response.status_code != 200 or response.streaming
+            or response.cookies):
+        return
+    versions = dict(static_versions)
+    versions.update(tag_versions(
+        set(getattr(response, 'cache_tags', ())) - set(versions)))
+    entry = _entry(response, versions)
+    finished = time.time()
+    entry['delta'] = finished - started
+    entry['expires'] = finished + timeout
+    cache.set(key, entry, timeout + stale_timeout)
+
+
+def etag(etag_func):
+    """django.views.decorators.http.etag для страниц из cache_tagged_page.
+
+    ETag считается по текущим версиям тегов, а устаревшая копия, которую
+    отдают, пока страницу пересобирает другой запрос, этим версиям не
+    соответствует. Такой ответ уходит без ETag и с no-cache, чтобы клиент
+    не получал на неё 304 до следующей инвалидации.
+    """
+    def decorator(view):
+        conditional = http.etag(etag_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            if getattr(response, 'stale', False):
+                del response['ETag']
+                patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_tagged_page(timeout, key_prefix, tags=None, stale_timeout=None):
+    """Кэширует GET-ответ вьюхи с инвалидацией по тегам.
+
+    tags(request, *args, **kwargs) возвращает теги, известные до вызова
+    вьюхи: их версии снимаются до чтения данных, поэтому инвалидация во
+    время рендера не даст сохранить устаревшую страницу. Теги из
+    tag_response добавляются после рендера.
+
+    Ключ учитывает полный путь с параметрами и пользователя, так как
+    страницы показывают меню и кнопки под конкретного читателя.
+
+    Устаревшую страницу пересобирает один запрос, взявший блокировку в
+    кэше; остальные ещё stale_timeout секунд (по умолчанию timeout)
+    получают старую копию, а если копии нет — ждут результата.
+    """
+    if stale_timeout is None:
+        stale_timeout = timeout
+
+    def decorator(view):
+        def rebuild(key, static_versions, request, *args, **kwargs):
+            started = time.time()
+            response = view(request, *args, **kwargs)
+            _store_page(key, response, static_versions, started, timeout,
+                        stale_timeout)
+            return response
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = page_key(request, key_prefix)
+            static_tags = tags(request, *args, **kwargs) if tags else []
+            entry, fresh, current = _lookup(key, static_tags)
+            if fresh and not _expires_early(entry):
+                _count(key_prefix, 'hit')
+                return entry['value']
+            lock_key = LOCK_PREFIX + key
+            owns_lock = cache.add(lock_key, 1, lock_timeout)
+            if not owns_lock:
+                response, current = _follow_rebuild(
+                    key_prefix, key, entry, fresh, static_tags)
+                if response is not None:
+                    return response
+            _count(key_prefix, 'miss')
+            try:
+                return rebuild(
+                    key, {tag: current[tag] for tag in static_tags},
+                    request, *args, **kwargs)
+            finally:
+                if owns_lock:
+                    cache.delete(lock_key)
+        return wrapper
+    return decorator
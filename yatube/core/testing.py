@@ -0,0 +1,20 @@
+"""Помощники для тестов."""
+import atexit
+import copy
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+
+
+def isolated_caches():
+    """Те же CACHES, но общий уровень — во временном каталоге.
+
+    Так тесты не читают и не чистят кэш работающего сайта.
+    """
+    location = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, location, ignore_errors=True)
+    caches = copy.deepcopy(settings.CACHES)
+    caches['shared']['LOCATION'] = location
+    return override_settings(CACHES=caches)
@@ -0,0 +1,159 @@
+import pickle
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from . import tagged_cache
+from .cache_backends import TwoLevelCache
+from .testing import isolated_caches
+
+
+@isolated_caches()
+class TaggedCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidate_by_tag(self):
+        """Запись устаревает при инвалидации любого её тега."""
+        tagged_cache.put('a', 1, ['post:1', 'feed:index'])
+        tagged_cache.put('b', 2, ['post:2'])
+        self.assertEqual(tagged_cache.get('a'), 1)
+        tagged_cache.invalidate('feed:index')
+        self.assertIsNone(tagged_cache.get('a'))
+        self.assertEqual(tagged_cache.get('b'), 2)
+
+    def test_get_many_skips_stale(self):
+        """get_many возвращает только свежие записи."""
+        tagged_cache.put_many(
+            {'a': 1, 'b': 2}, {'a': ['author:1'], 'b': ['author:2']})
+        tagged_cache.invalidate('author:2')
+        self.assertEqual(tagged_cache.get_many(['a', 'b', 'c']), {'a': 1})
+
+    def test_evicted_tag_version_makes_entry_stale(self):
+        """Вытесненный счётчик тега не даёт отдать старую запись."""
+        tagged_cache.put('a', 1, ['group:cats'])
+        cache.delete(tagged_cache.TAG_PREFIX + 'group:cats')
+        self.assertIsNone(tagged_cache.get('a'))
+
+
+@isolated_caches()
+class CachedPageTests(TestCase):
+    def setUp(self):
+        tagged_cache.flush_stats()
+        cache.clear()
+        self.calls = 0
+        self.request = RequestFactory().get('/page/')
+        self.request.user = AnonymousUser()
+
+        @tagged_cache.cache_tagged_page(
+            60, key_prefix='test_page', tags=lambda request: ['page'])
+        def view(request):
+            self.calls += 1
+            return HttpResponse(str(self.calls))
+        self.view = view
+
+    def hold_lock(self):
+        """Имитирует другой воркер, пересобирающий страницу."""
+        key = tagged_cache.page_key(self.request, 'test_page')
+        cache.add(tagged_cache.LOCK_PREFIX + key, 1)
+
+    def test_hit_after_miss(self):
+        """Второй запрос отдаётся из кэша без вызова вьюхи."""
+        self.view(self.request)
+        response = self.view(self.request)
+        self.assertEqual(response.content, b'1')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(tagged_cache.stats('test_page'),
+                         {'hit': 1, 'miss': 1, 'stale': 0})
+
+    def test_stale_copy_served_while_rebuilding(self):
+        """Пока страницу пересобирает другой запрос, отдаётся старая копия."""
+        self.view(self.request)
+        tagged_cache.invalidate('page')
+        self.hold_lock()
+        response = self.view(self.request)
+        self.assertEqual(response.content, b'1')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(tagged_cache.stats('test_page')['stale'], 1)
+
+    def test_rebuild_after_invalidation(self):
+        """После инвалидации тега страница собирается заново."""
+        self.view(self.request)
+        tagged_cache.invalidate('page')
+        response = self.view(self.request)
+        self.assertEqual(response.content, b'2')
+        self.assertEqual(tagged_cache.stats('test_page')['miss'], 2)
+
+    def test_early_expiry(self):
+        """Запись у самого срока пересобирается заранее."""
+        self.view(self.request)
+        key = tagged_cache.page_key(self.request, 'test_page')
+        entry = cache.get(key)
+        entry['expires'] = time.time()
+        cache.set(key, entry)
+        self.view(self.request)
+        self.assertEqual(self.calls, 2)
+
+
+@isolated_caches()
+class TwoLevelCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Два экземпляра с общим L2 — как два воркера.
+        self.first = TwoLevelCache('shared', {'OPTIONS': {'MAX_ENTRIES': 2}})
+        self.second = TwoLevelCache('shared', {})
+
+    def test_write_reaches_other_process(self):
+        self.first.set('key', 1)
+        self.assertEqual(self.second.get('key'), 1)
+        self.first.set('key', 2)
+        self.assertEqual(self.second.get('key'), 2)
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+
+    def test_incr_reaches_other_process(self):
+        self.first.set('counter', 1)
+        self.assertEqual(self.second.get('counter'), 1)
+        self.first.incr('counter')
+        self.assertEqual(self.second.get('counter'), 2)
+
+    def test_local_hit_returns_copy(self):
+        self.first.set('list', [1])
+        self.first.get('list').append(2)
+        self.assertEqual(self.first.get('list'), [1])
+
+    def test_l1_is_bounded(self):
+        for key in ('a', 'b', 'c'):
+            self.first.set(key, key)
+            self.first.get(key)
+        self.assertEqual(len(self.first._l1), 2)
+        self.assertEqual(self.first.get('a'), 'a')
+
+    def test_get_many_sees_other_process_writes(self):
+        self.first.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.first.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2})
+        self.second.set('b', 3)
+        self.assertEqual(self.first.get_many(['a', 'b']), {'a': 1, 'b': 3})
+
+    def test_incr_keeps_expiry(self):
+        """incr не навешивает срок жизни по умолчанию."""
+        shared = caches['shared']
+        self.first.set('version', 1, None)
+        self.first.incr('version')
+        with open(shared._key_to_file('version'), 'rb') as f:
+            self.assertIsNone(pickle.load(f))
+        self.first.set('counter', 1, 1000)
+        self.first.incr('counter')
+        with open(shared._key_to_file('counter'), 'rb') as f:
+            self.assertAlmostEqual(pickle.load(f), time.time() + 1000,
+                                   delta=5)
+        self.assertEqual(self.second.get('counter'), 2)
+
+    def test_add_does_not_overwrite(self):
+        self.assertTrue(self.first.add('lock', 1))
+        self.assertFalse(self.second.add('lock', 2))
+        self.assertEqual(self.second.get('lock'), 1)
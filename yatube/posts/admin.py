@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Post, Group
 
 
@@ -17,5 +18,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по тексту идёт через FTS-индекс, а не LIKE '%...%'.
+        if not search_term or not search.is_supported():
+            return super().get_search_results(
+                request, queryset, search_term)
+        queryset = queryset.filter(pk__in=search.matching_ids(search_term))
+        return queryset, False
+
 
 admin.site.register(Group)
@@ -0,0 +1,252 @@
+"""JSON API.
+
+Ответы собираются компактными сериализаторами из нужных полей, списки
+листаются курсором (next_cursor в ответе), как и HTML-ленты.
+
+Ленты и пост отдают поля из ?fields=id,text,author, по умолчанию все
+доступные; из базы читаются только нужные для них колонки. Автор и
+группа встраиваются объектами, которые для всей страницы читаются по
+одному запросу. Условный GET работает на тех же ETag, что и HTML-страницы.
+"""
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.views.decorators.http import etag, require_http_methods
+
+from core.tagged_cache import tags_etag
+from . import feed
+from .forms import CommentForm
+from .models import Comment, Follow, Group, Post
+from .utils import CursorPaginator, get_comments_page, max_on_page
+from .views import group_etag, index_etag, post_etag, profile_etag
+
+User = get_user_model()
+
+comment_template = 'posts/includes/comment.html'
+
+
+def _image_url(post, related):
+    return post.image.url if post.image else None
+
+
+# Поле ответа: (колонки Post, которые оно читает; значение по посту и
+# встроенным объектам страницы).
+post_fields = {
+    'id': ((), lambda post, related: post.pk),
+    'text': (('text',), lambda post, related: post.text),
+    'pub_date': (
+        ('pub_date',), lambda post, related: post.pub_date.isoformat()),
+    'image': (('image',), _image_url),
+    'image_width': (
+        ('image_width',), lambda post, related: post.image_width),
+    'image_height': (
+        ('image_height',), lambda post, related: post.image_height),
+    'comments_count': (
+        ('comments_count',), lambda post, related: post.comments_count),
+    'author': (
+        ('author_id',),
+        lambda post, related: related['author'].get(post.author_id)),
+    'group': (
+        ('group_id',),
+        lambda post, related: related['group'].get(post.group_id)),
+}
+# Комментарии сбрасывают ETag только страницы поста, поэтому в лентах
+# счётчика комментариев нет: он устаревал бы за ответом 304.
+feed_post_fields = tuple(
+    name for name in post_fields if name != 'comments_count')
+author_fields = ('id', 'username', 'first_name', 'last_name')
+group_fields = ('id', 'slug', 'title')
+
+
+def error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def with_fields(allowed):
+    """Передаёт во вьюху кортеж полей из ?fields= (по умолчанию все
+    allowed) или отвечает 400."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            raw = request.GET.get('fields')
+            if raw:
+                fields = tuple(dict.fromkeys(
+                    name.strip() for name in raw.split(',') if name.strip()))
+            else:
+                fields = allowed
+            unknown = [name for name in fields if name not in allowed]
+            if unknown or not fields:
+                return error(
+                    f'Неизвестные поля: {", ".join(unknown)}; доступны: '
+                    f'{", ".join(allowed)}', 400)
+            return view(request, *args, fields=fields, **kwargs)
+        return wrapper
+    return decorator
+
+
+def post_columns(fields):
+    """Колонки Post для fields и ключа курсора."""
+    columns = {'id', 'pub_date'}
+    for name in fields:
+        columns.update(post_fields[name][0])
+    return sorted(columns)
+
+
+def post_queryset(fields):
+    """Посты только с колонками для fields и ключа курсора."""
+    return Post.objects.only(*post_columns(fields))
+
+
+def _related(posts, fields):
+    """Авторы и группы страницы: по запросу на каждый вид объектов."""
+    related = {'author': {}, 'group': {}}
+    if 'author' in fields:
+        ids = {post.author_id for post in posts}
+        related['author'] = {
+            row['id']: row for row in
+            User.objects.filter(pk__in=ids).values(*author_fields)
+        }
+    if 'group' in fields:
+        ids = {post.group_id for post in posts} - {None}
+        if ids:
+            related['group'] = {
+                row['id']: row for row in
+                Group.objects.filter(pk__in=ids).values(*group_fields)
+            }
+    return related
+
+
+def serialize_posts(posts, fields):
+    posts = list(posts)
+    related = _related(posts, fields)
+    getters = [(name, post_fields[name][1]) for name in fields]
+    return [
+        {name: getter(post, related) for name, getter in getters}
+        for post in posts
+    ]
+
+
+def _page_response(paginator, request, fields):
+    page = paginator.get_cursor_page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': serialize_posts(page, fields),
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+def follow_etag(request):
+    # Лента меняется с постами любого из авторов и с подписками читателя.
+    if not request.user.is_authenticated:
+        return None
+    author_ids = Follow.objects.filter(
+        user=request.user).values_list('author_id', flat=True)
+    return tags_etag(request, [
+        f'profile:{request.user.pk}', 'authors', 'groups',
+        *(f'profile:{author_id}' for author_id in author_ids),
+    ])
+
+
+@etag(index_etag)
+@with_fields(feed_post_fields)
+def index(request, fields):
+    paginator = CursorPaginator(post_queryset(fields), max_on_page)
+    return _page_response(paginator, request, fields)
+
+
+@etag(group_etag)
+@with_fields(feed_post_fields)
+def group_posts(request, slug, fields):
+    group_id = (
+        Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    )
+    if group_id is None:
+        return error('Группа не найдена', 404)
+    paginator = CursorPaginator(
+        post_queryset(fields).filter(group_id=group_id), max_on_page)
+    return _page_response(paginator, request, fields)
+
+
+@etag(profile_etag)
+@with_fields(feed_post_fields)
+def profile(request, username, fields):
+    user_id = (
+        User.objects.filter(username=username)
+        .values_list('pk', flat=True).first()
+    )
+    if user_id is None:
+        return error('Пользователь не найден', 404)
+    paginator = CursorPaginator(
+        post_queryset(fields).filter(author_id=user_id), max_on_page)
+    return _page_response(paginator, request, fields)
+
+
+@etag(follow_etag)
+@with_fields(feed_post_fields)
+def follow_index(request, fields):
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация', 403)
+    paginator = feed.get_feed(
+        request.user, fields=post_columns(fields), related=())
+    return _page_response(paginator, request, fields)
+
+
+@etag(post_etag)
+@with_fields(tuple(post_fields))
+def post_detail(request, post_id, fields):
+    post = post_queryset(fields).filter(pk=post_id).first()
+    if post is None:
+        return error('Пост не найден', 404)
+    return JsonResponse(serialize_posts([post], fields)[0])
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username if comment.author else None,
+        'text': comment.text,
+        'pub_date': comment.pub_date.isoformat(),
+    }
+
+
+@etag(post_etag)
+def _comment_list(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return error('Пост не найден', 404)
+    page = get_comments_page(
+        Comment.objects.filter(post_id=post_id), request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [serialize_comment(comment) for comment in page],
+        'next_cursor': page.next_cursor,
+    })
+
+
+def _comment_create(request, post_id):
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация', 403)
+    if not Post.objects.filter(pk=post_id).exists():
+        return error('Пост не найден', 404)
+    form = CommentForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    comment = form.save(commit=False)
+    comment.post_id = post_id
+    comment.author = request.user
+    comment.save()
+    # Клиенту хватает готового фрагмента нового комментария, страница
+    # поста заново не рендерится.
+    return JsonResponse({
+        'comment': serialize_comment(comment),
+        'html': render_to_string(
+            comment_template, {'comment': comment}, request),
+    }, status=201)
+
+
+@require_http_methods(['GET', 'HEAD', 'POST'])
+def comments(request, post_id):
+    """Комментарии поста: GET — порция списка, POST — новый комментарий."""
+    if request.method == 'POST':
+        return _comment_create(request, post_id)
+    return _comment_list(request, post_id)
@@ -0,0 +1,184 @@
+"""Замер задержки вьюх posts для команды benchmark_views.
+
+Каждый маршрут из posts/urls.py запрашивается через тестовый клиент
+(со всеми middleware) на самых тяжёлых объектах набора: самом
+обсуждаемом посте, самом плодовитом авторе, самой большой группе и
+читателе с наибольшим числом подписок. Для маршрута считаются
+перцентили задержки, число запросов к базе и размер ответа.
+
+Замер идёт на отдельном временном кэше, а запросы, меняющие данные,
+откатываются, чтобы не сдвигать набор для следующих маршрутов.
+"""
+import json
+import math
+import time
+from contextlib import nullcontext
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.testing import isolated_caches
+from . import urls
+from .models import Group, Post, UserCounters
+
+# Параметры seed_yatube для наборов данных разного размера.
+dataset_sizes = {
+    'small': {'users': 100, 'groups': 5, 'posts': 1000, 'comments': 2000,
+              'follows_per_user': 5},
+    'medium': {'users': 1000, 'groups': 20, 'posts': 20000,
+               'comments': 40000, 'follows_per_user': 10},
+    'large': {'users': 10000, 'groups': 50, 'posts': 200000,
+              'comments': 400000, 'follows_per_user': 20},
+}
+# Маршруты, которые меряются не простым GET: метод, данные запроса и
+# чей клиент нужен (автора поста или читателя).
+request_plans = {
+    'add_comment': ('post', {'text': 'benchmark'}, 'reader'),
+    'post_edit': ('get', {}, 'author'),
+    'search': ('get', lambda samples: {'q': samples['word']}, 'reader'),
+}
+# Маршруты, которые меняют данные даже на GET.
+mutating_routes = {'add_comment', 'profile_follow', 'profile_unfollow'}
+percentiles = (50, 95, 99)
+# Рост p95 меньше этого считается шумом, сколько бы раз он ни составил.
+noise_floor_ms: float = 5.0
+
+
+def samples():
+    """Самые тяжёлые объекты набора и параметры их URL."""
+    post = Post.objects.order_by('-comments_count', 'pk').first()
+    author = (
+        UserCounters.objects.select_related('user')
+        .order_by('-posts_count', 'user_id').first().user
+    )
+    reader = (
+        UserCounters.objects.select_related('user')
+        .order_by('-following_count', 'user_id').first().user
+    )
+    group = (
+        Group.objects.annotate(total=Count('posts'))
+        .order_by('-total', 'pk').first()
+    )
+    return {
+        'post_id': post.pk,
+        'post_author': post.author,
+        'username': author.username,
+        'reader': reader,
+        'slug': group.slug if group else None,
+        'word': post.text.split()[0],
+    }
+
+
+def routes(sample):
+    """(имя, URL, метод, данные, пользователь) для маршрутов posts/urls.py;
+    маршруты без подходящих параметров пропускаются."""
+    for pattern in urls.urlpatterns:
+        names = pattern.pattern.converters.keys()
+        kwargs = {name: sample.get(name) for name in names}
+        if None in kwargs.values():
+            continue
+        method, data, user = request_plans.get(
+            pattern.name, ('get', {}, 'reader'))
+        if callable(data):
+            data = data(sample)
+        user = sample['post_author'] if user == 'author' else sample['reader']
+        url = reverse(f'{urls.app_name}:{pattern.name}', kwargs=kwargs)
+        yield pattern.name, url, method, data, user
+
+
+def percentile(values, rank):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    index = max(math.ceil(rank / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def _body_size(response):
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def measure(client, method, url, data, repeat, warm=False, rollback=False):
+    """Задержки (мс), запросы к базе, байты и статус ответа маршрута.
+
+    Без warm кэш чистится перед каждым запросом, и меряется полный
+    рендер; с warm — повторные визиты в тёплый кэш. С rollback каждый
+    запрос идёт в транзакции, которая затем откатывается.
+    """
+    timings = []
+    queries = size = status = None
+    send = getattr(client, method)
+    for _ in range(repeat):
+        if not warm:
+            cache.clear()
+        with transaction.atomic() if rollback else nullcontext():
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = send(url, data)
+                size = _body_size(response)
+                timings.append((time.perf_counter() - started) * 1000)
+            if rollback:
+                transaction.set_rollback(True)
+        queries = len(captured)
+        status = response.status_code
+    result = {
+        f'p{rank}_ms': round(percentile(timings, rank), 3)
+        for rank in percentiles
+    }
+    result.update(queries=queries, bytes=size, status=status)
+    return result
+
+
+def run(repeat=20, warm=False):
+    """Результаты по всем маршрутам на текущей базе."""
+    sample = samples()
+    clients = {}
+    results = {}
+    with isolated_caches():
+        for name, url, method, data, user in routes(sample):
+            if user.pk not in clients:
+                clients[user.pk] = Client()
+                clients[user.pk].force_login(user)
+            results[name] = measure(
+                clients[user.pk], method, url, data, repeat, warm,
+                rollback=name in mutating_routes)
+    return results
+
+
+def compare(results, baseline, threshold=1.2):
+    """Регрессии относительно baseline: p95 выросла больше чем в
+    threshold раз и больше чем на noise_floor_ms или прибавились
+    запросы к базе."""
+    regressions = []
+    for size, routes_results in results.items():
+        for name, result in routes_results.items():
+            old = baseline.get(size, {}).get(name)
+            if old is None:
+                continue
+            if result['p95_ms'] > max(old['p95_ms'] * threshold,
+                                      old['p95_ms'] + noise_floor_ms):
+                regressions.append(
+                    f'{size} {name}: p95 {old["p95_ms"]} -> '
+                    f'{result["p95_ms"]} мс')
+            if result['queries'] > old['queries']:
+                regressions.append(
+                    f'{size} {name}: запросов {old["queries"]} -> '
+                    f'{result["queries"]}')
+    return regressions
+
+
+def load(path):
+    with open(path) as source:
+        return json.load(source)['results']
+
+
+def dump(results, path):
+    with open(path, 'w') as target:
+        json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'results': results}, target, ensure_ascii=False,
+                  indent=2)
@@ -0,0 +1,79 @@
+"""Сборка мусора среди картинок постов.
+
+Картинки лежат в ContentAddressedStorage, и один файл может быть у многих
+постов. Счётчик ссылок на файл — число строк Post с этим image (поле
+проиндексировано), поэтому он не расходится с данными. Файл без ссылок
+удаляется вместе с миниатюрами, если он не трогался grace_period секунд:
+так не пропадёт картинка поста, который ещё не закоммичен. Перед
+удалением ссылки и возраст проверяются заново под блокировкой хранилища,
+чтобы одновременная загрузка того же содержимого не осталась без файла.
+"""
+import os
+import time
+from itertools import islice
+
+from django.db import transaction
+from sorl.thumbnail import delete as delete_with_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from core.storage import is_blob
+from .models import Post
+
+grace_period: int = 24 * 60 * 60
+batch_size: int = 500
+
+
+def storage():
+    return Post._meta.get_field('image').storage
+
+
+def references(name):
+    return Post.objects.filter(image=name).count()
+
+
+def _age(name):
+    try:
+        return time.time() - os.path.getmtime(storage().path(name))
+    except FileNotFoundError:
+        return None
+
+
+def collect_garbage(names=None, grace=grace_period):
+    """Удаляет файлы картинок без ссылок; names — проверить только эти,
+    иначе все. Возвращает имена удалённых."""
+    if names is None:
+        names = storage().blobs(Post._meta.get_field('image').upload_to)
+    names = (name for name in names if is_blob(name))
+    deleted = []
+    while True:
+        batch = list(islice(names, batch_size))
+        if not batch:
+            return deleted
+        referenced = set(
+            Post.objects.filter(image__in=batch)
+            .values_list('image', flat=True)
+        )
+        for name in batch:
+            if name not in referenced and _delete_unused(name, grace):
+                deleted.append(name)
+
+
+def _delete_unused(name, grace):
+    if not _is_stale(name, grace):
+        return False
+    with storage().lock(name):
+        if not _is_stale(name, grace) or references(name):
+            return False
+        delete_with_thumbnails(ImageFile(name, storage()))
+    return True
+
+
+def _is_stale(name, grace):
+    age = _age(name)
+    return age is not None and age >= grace
+
+
+def release_on_commit(name):
+    """Проверяет после коммита, не осталась ли картинка без ссылок."""
+    if name and is_blob(name):
+        transaction.on_commit(lambda: collect_garbage([name]))
@@ -0,0 +1,47 @@
+"""Кэш отрендеренных карточек постов для лент.
+
+Ключ карточки содержит id поста и его card_version, поэтому правка
+поста или смена ярлыка группы просто меняют ключ, а старые карточки
+дотухают сами. Карточка помечена тегом автора и устаревает при его
+переименовании. Вся страница читается одним get_many.
+"""
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from core import tagged_cache
+from .thumbnails import prime_thumbnails
+
+card_template = 'posts/includes/post_cycle.html'
+# Поля, которые показывает карточка: их смена устаревает карточки.
+author_card_fields = ('username', 'first_name', 'last_name')
+group_card_fields = ('slug',)
+
+
+def card_timeout():
+    return getattr(settings, 'POST_CARD_CACHE_TIMEOUT', 60 * 60)
+
+
+def card_key(post):
+    return f'post_card:{post.pk}:{post.card_version}'
+
+
+def render_cards(posts):
+    """HTML карточек в порядке posts: из кэша или свежеотрендеренные."""
+    keys = [card_key(post) for post in posts]
+    cached = tagged_cache.get_many(keys)
+    missing = {}
+    tags = {}
+    cards = []
+    # Миниатюры нужны только карточкам, которых нет в кэше.
+    prime_thumbnails([
+        post for key, post in zip(keys, posts) if key not in cached])
+    for key, post in zip(keys, posts):
+        card = cached.get(key)
+        if card is None:
+            card = render_to_string(card_template, {'post': post})
+            missing[key] = card
+            tags[key] = [f'author:{post.author_id}']
+        cards.append(card)
+    if missing:
+        tagged_cache.put_many(missing, tags, card_timeout())
+    return cards
@@ -0,0 +1,31 @@
+"""Денормализованные счётчики постов, комментариев и подписок."""
+from django.db.models import F
+
+from .models import Post, UserCounters
+
+
+def bump_user(user_id, create=True, **deltas):
+    """Атомарно сдвигает счётчики пользователя.
+
+    При create=False отсутствующая строка не создаётся: при удалении
+    пользователя каскад убирает её раньше его постов и подписок.
+    """
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    counters = UserCounters.objects.filter(user_id=user_id)
+    if not counters.update(**updates) and create:
+        UserCounters.objects.bulk_create(
+            [UserCounters(user_id=user_id)], ignore_conflicts=True)
+        counters.update(**updates)
+
+
+def bump_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta)
+
+
+def get_counters(user):
+    """Счётчики пользователя; для пользователя без строки — нули."""
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        return UserCounters(user=user)
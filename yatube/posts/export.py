@@ -0,0 +1,149 @@
+"""Потоковая выгрузка постов и комментариев.
+
+Строки читаются из базы порциями через iterator() (в PostgreSQL —
+серверным курсором) и сразу уходят клиенту, поэтому память процесса не
+зависит от размера выгрузки. Записи того же вида, что читает команда
+load_content, так что выгрузку можно загрузить обратно. Комментарии
+удалённых пользователей выгружаются с author null, и load_content их
+пропускает.
+
+Выгрузка — NDJSON или ZIP с content.ndjson и, по желанию, файлами
+картинок в images/.
+"""
+import json
+import zipfile
+from collections import namedtuple
+from urllib.parse import quote
+
+from .models import Comment, Post
+
+chunk_size: int = 2000
+# Сколько байт копить перед отдачей очередного куска ZIP.
+zip_flush_bytes: int = 64 * 1024
+
+content_types = {'ndjson': 'application/x-ndjson', 'zip': 'application/zip'}
+
+Export = namedtuple('Export', ('name', 'posts', 'comments'))
+
+
+def user_export(user):
+    """Посты пользователя и его комментарии."""
+    return Export(
+        user.username,
+        Post.objects.filter(author=user),
+        Comment.objects.filter(author=user),
+    )
+
+
+def group_export(group):
+    """Архив группы: её посты и все комментарии к ним."""
+    return Export(
+        f'group-{group.slug}',
+        Post.objects.filter(group=group),
+        Comment.objects.filter(post__group=group),
+    )
+
+
+def records(export):
+    posts = export.posts.order_by('pk').values_list(
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date', 'image')
+    for pk, author, group, text, pub_date, image in posts.iterator(
+            chunk_size=chunk_size):
+        record = {'type': 'post', 'id': pk, 'author': author, 'text': text,
+                  'pub_date': pub_date.isoformat()}
+        if group:
+            record['group'] = group
+        if image:
+            record['image'] = image
+        yield record
+    comments = export.comments.order_by('pk').values_list(
+        'pk', 'post_id', 'author__username', 'text', 'pub_date')
+    for pk, post_id, author, text, pub_date in comments.iterator(
+            chunk_size=chunk_size):
+        yield {'type': 'comment', 'id': pk, 'post': post_id,
+               'author': author, 'text': text,
+               'pub_date': pub_date.isoformat()}
+
+
+def ndjson(export):
+    for record in records(export):
+        yield json.dumps(record, ensure_ascii=False).encode() + b'\n'
+
+
+class _Pipe:
+    """Файл без seek для zipfile: копит записанное до drain()."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+def zip_archive(export, images=False):
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('content.ndjson', 'w', force_zip64=True) as member:
+            for line in ndjson(export):
+                member.write(line)
+                if pipe.size >= zip_flush_bytes:
+                    yield pipe.drain()
+        yield pipe.drain()
+        if images:
+            storage = Post._meta.get_field('image').storage
+            # Одинаковые картинки лежат одним файлом и кладутся один раз.
+            names = (
+                export.posts.exclude(image='').order_by('image')
+                .values_list('image', flat=True).distinct()
+            )
+            for name in names.iterator(chunk_size=chunk_size):
+                try:
+                    source = storage.open(name)
+                except FileNotFoundError:
+                    continue
+                with source, archive.open(
+                        f'images/{name}', 'w', force_zip64=True) as member:
+                    for chunk in source.chunks():
+                        member.write(chunk)
+                        yield pipe.drain()
+    yield pipe.drain()
+
+
+def stream(export, export_format='ndjson', images=False):
+    """Куски байт выгрузки в формате ndjson или zip."""
+    if export_format == 'zip':
+        return zip_archive(export, images)
+    return ndjson(export)
+
+
+def filename(export, export_format):
+    return f'{export.name}.{export_format}'
+
+
+def content_disposition(export, export_format):
+    """Заголовок Content-Disposition с именем файла выгрузки.
+
+    Имя не в ASCII (например, кириллический username) передаётся в
+    filename* по RFC 5987, а в filename остаётся ASCII-запасное имя:
+    иначе Django закодировал бы весь заголовок по MIME, и браузер не
+    увидел бы ни attachment, ни имени.
+    """
+    name = filename(export, export_format)
+    try:
+        name.encode('ascii')
+    except UnicodeEncodeError:
+        return (f'attachment; filename="export.{export_format}"; '
+                f"filename*=UTF-8''{quote(name)}")
+    return f'attachment; filename="{name}"'
@@ -0,0 +1,170 @@
+"""Гибридная лента подписок: push для обычных авторов, pull для популярных.
+
+Посты обычного автора сразу раскладываются по лентам подписчиков
+(FeedEntry), а ленты достраиваются и подрезаются при подписке и отписке.
+Популярные авторы (UserCounters.pull_feed) не раскладываются, их посты
+подмешиваются при чтении ленты слиянием с материализованной частью. При
+подписке в ленту досыпаются только последние FEED_BACKFILL_POSTS постов
+автора: более старые читатель найдёт в его профиле.
+
+Автор становится популярным, как только набирает FEED_FANOUT_THRESHOLD
+подписчиков, а обратно переводится только командой rebuild_feeds и только
+если подписчиков меньше FEED_FANOUT_DEMOTE_THRESHOLD: раскладка его постов
+по лентам слишком дорога для запроса на отписку, а разрыв между порогами
+не даёт автору на границе переключаться туда и обратно.
+
+После изменения порогов ленты нужно пересобрать командой rebuild_feeds.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .models import FeedEntry, Follow, Post, PostQuerySet, UserCounters
+from .utils import CursorPaginator, MergedCursorPaginator, max_on_page
+
+batch_size: int = 1000
+
+
+def fanout_threshold():
+    return getattr(settings, 'FEED_FANOUT_THRESHOLD', 1000)
+
+
+def demote_threshold():
+    return min(
+        getattr(settings, 'FEED_FANOUT_DEMOTE_THRESHOLD',
+                fanout_threshold() * 4 // 5),
+        fanout_threshold(),
+    )
+
+
+def backfill_posts():
+    return getattr(settings, 'FEED_BACKFILL_POSTS', 200)
+
+
+def is_celebrity(author_id):
+    return UserCounters.objects.filter(
+        user_id=author_id, pull_feed=True).exists()
+
+
+def promote(author_id):
+    """Делает популярным автора, набравшего порог; True, если он популярен.
+    """
+    UserCounters.objects.filter(
+        user_id=author_id,
+        pull_feed=False,
+        followers_count__gte=fanout_threshold(),
+    ).update(pull_feed=True)
+    return is_celebrity(author_id)
+
+
+def update_celebrities():
+    """Сверяет отметки популярности с порогами.
+
+    Возвращает число повышенных и пониженных авторов. Ленты подписчиков
+    пониженных авторов после этого нужно пересобрать.
+    """
+    promoted = UserCounters.objects.filter(
+        pull_feed=False, followers_count__gte=fanout_threshold(),
+    ).update(pull_feed=True)
+    demoted = UserCounters.objects.filter(
+        pull_feed=True, followers_count__lt=demote_threshold(),
+    ).update(pull_feed=False)
+    return promoted, demoted
+
+
+def celebrity_authors(user):
+    """id популярных авторов, на которых подписан пользователь."""
+    return list(
+        Follow.objects.filter(
+            user=user, author__counters__pull_feed=True,
+        ).values_list('author_id', flat=True)
+    )
+
+
+def _bulk_insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Кладёт пост в ленты всех подписчиков обычного автора."""
+    if is_celebrity(post.author_id):
+        return
+    follower_ids = (
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+        .iterator()
+    )
+    with transaction.atomic():
+        _bulk_insert(
+            FeedEntry(user_id=user_id, post_id=post.pk,
+                      author_id=post.author_id, pub_date=post.pub_date)
+            for user_id in follower_ids
+        )
+
+
+def add_author_to_feed(user_id, author_id):
+    """Досыпает в ленту читателя последние посты автора, на которого
+    он подписался."""
+    if promote(author_id):
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date', '-pk')
+        .values_list('pk', 'pub_date')[:backfill_posts()]
+    )
+    with transaction.atomic():
+        _bulk_insert(
+            FeedEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        )
+
+
+def remove_author_from_feed(user_id, author_id):
+    """Убирает автора из ленты читателя после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild_feed(user_id):
+    """Пересобирает ленту читателя с нуля по его подпискам."""
+    author_ids = list(
+        Follow.objects.filter(user_id=user_id)
+        .values_list('author_id', flat=True)
+    )
+    with transaction.atomic():
+        FeedEntry.objects.filter(user_id=user_id).delete()
+        for author_id in author_ids:
+            add_author_to_feed(user_id, author_id)
+
+
+def get_feed(user, per_page=max_on_page, fields=PostQuerySet.feed_fields,
+             related=('author', 'group')):
+    """Паджинатор ленты: материализованная часть плюс популярные авторы.
+
+    Посты читаются с колонками fields и связями related, как в for_feed
+    по умолчанию, и в записях ленты, и в постах популярных авторов.
+    """
+    celebrities = celebrity_authors(user)
+    joins = [f'post__{name}' for name in related] or ['post']
+    entries = (
+        FeedEntry.objects.filter(user=user)
+        .exclude(author_id__in=celebrities)
+        .select_related(*joins)
+        .only('pub_date', 'post', *(f'post__{name}' for name in fields))
+    )
+    posts = Post.objects.select_related(*related).only(*fields)
+    sources = [
+        CursorPaginator(entries, per_page,
+                        key=('pub_date', 'post_id'), related='post')
+    ]
+    sources.extend(
+        CursorPaginator(posts.filter(author_id=author_id), per_page)
+        for author_id in celebrities
+    )
+    return MergedCursorPaginator(sources, per_page)
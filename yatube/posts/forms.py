@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Post, Comment
+from .uploads import normalize_image
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +10,17 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Уже сохранённую картинку при правке поста не трогаем.
+        if not isinstance(image, UploadedFile):
+            return image
+        image, self.image_report = normalize_image(image)
+        self.instance.image_width, self.instance.image_height = (
+            self.image_report.size)
+        self.instance.image_placeholder = self.image_report.placeholder
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
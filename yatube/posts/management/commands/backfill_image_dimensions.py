@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from core import tagged_cache
+from posts.models import Post
+from posts.uploads import describe_image
+
+
+class Command(BaseCommand):
+    help = 'Заполняет размеры и цвет-заглушку картинок старых постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов обновлять одним запросом',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = (
+            Post.objects.exclude(image='')
+            .filter(image_width__isnull=True)
+            .only('pk', 'image', 'card_version', 'author_id', 'group_id')
+            .order_by('pk')
+        )
+        last_id = 0
+        updated = missing = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            described = []
+            for post in batch:
+                try:
+                    (post.image_width, post.image_height,
+                     post.image_placeholder) = describe_image(post.image)
+                except (OSError, ValueError):
+                    missing += 1
+                    continue
+                # Карточки с новыми размерами должны перерисоваться.
+                post.card_version += 1
+                described.append(post)
+            Post.objects.bulk_update(described, [
+                'image_width', 'image_height', 'image_placeholder',
+                'card_version',
+            ])
+            # bulk_update обходит сигналы, поэтому страницы с этими
+            # постами сбрасываются здесь.
+            tags = {'feed:index'}
+            for post in described:
+                tags.add(f'post:{post.pk}')
+                tags.add(f'profile:{post.author_id}')
+                if post.group_id:
+                    tags.add(f'group:{post.group_id}')
+            tagged_cache.invalidate(*tags)
+            updated += len(described)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено постов: {updated}, без файла картинки: {missing}'))
@@ -0,0 +1,86 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_test_environment, teardown_test_environment,
+)
+
+from core.testing import isolated_caches
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Меряет задержку, число запросов и размер ответа всех вьюх '
+            'posts на наборах данных разного размера в отдельной тестовой '
+            'базе и сравнивает с сохранённым baseline')
+
+    def add_arguments(self, parser):
+        names = ', '.join(benchmark.dataset_sizes)
+        parser.add_argument(
+            '--sizes', default='small,medium',
+            help=f'Наборы через запятую из {names}',
+        )
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Сколько раз запрашивать каждый URL')
+        parser.add_argument('--warm', action='store_true',
+                            help='Не чистить кэш между запросами')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Куда записать JSON')
+        parser.add_argument('--baseline', help='JSON прошлого прогона')
+        parser.add_argument(
+            '--threshold', type=float, default=1.2,
+            help='Во сколько раз может вырасти p95 без регрессии',
+        )
+
+    def handle(self, *args, **options):
+        sizes = [size for size in options['sizes'].split(',') if size]
+        unknown = set(sizes) - set(benchmark.dataset_sizes)
+        if unknown:
+            raise CommandError(f'Неизвестные наборы: {", ".join(unknown)}')
+        baseline = (
+            benchmark.load(options['baseline']) if options['baseline']
+            else {})
+        results = {}
+        # Наборы сеются в отдельную тестовую базу и временный кэш, рабочие
+        # не трогаются.
+        old_name = connection.settings_dict['NAME']
+        caches = isolated_caches()
+        caches.enable()
+        setup_test_environment()
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            for size in sizes:
+                call_command('flush', interactive=False, verbosity=0)
+                # Процессы-воркеры заново читают настройки и писали бы в
+                # рабочую базу, поэтому набор сеется в этом процессе.
+                call_command('seed_yatube', seed=options['seed'], workers=0,
+                             stdout=self.stderr,
+                             **benchmark.dataset_sizes[size])
+                results[size] = benchmark.run(
+                    options['repeat'], options['warm'])
+                self.report(size, results[size], baseline.get(size, {}))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            caches.disable()
+        if options['output']:
+            benchmark.dump(results, options['output'])
+        regressions = benchmark.compare(
+            results, baseline, options['threshold'])
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(regression))
+        if regressions:
+            raise CommandError(f'Регрессий: {len(regressions)}')
+
+    def report(self, size, results, baseline):
+        self.stdout.write(self.style.MIGRATE_HEADING(size))
+        self.stdout.write(
+            f'{"маршрут":<20}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"запросы":>9}{"байты":>10}{"было p95":>10}')
+        for name, result in results.items():
+            old = baseline.get(name, {}).get('p95_ms', '')
+            self.stdout.write(
+                f'{name:<20}{result["p50_ms"]:>9.1f}{result["p95_ms"]:>9.1f}'
+                f'{result["p99_ms"]:>9.1f}{result["queries"]:>9}'
+                f'{result["bytes"]:>10}{old:>10}')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import blobs
+
+
+class Command(BaseCommand):
+    help = 'Удаляет картинки постов, на которые не ссылается ни один пост'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=blobs.grace_period,
+            help='Не трогать файлы моложе стольких секунд',
+        )
+
+    def handle(self, *args, **options):
+        deleted = blobs.collect_garbage(grace=options['grace'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено картинок: {len(deleted)}'))
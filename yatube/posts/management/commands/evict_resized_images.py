@@ -0,0 +1,55 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import resize
+
+# Недописанные временные файлы старше этого считаются брошенными.
+stale_temp_age: int = 60 * 60
+
+
+class Command(BaseCommand):
+    help = ('Удаляет давно не запрошенные картинки из кэша /media/r/, '
+            'пока он не уложится в предел')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-bytes', type=int,
+            default=getattr(settings, 'RESIZE_CACHE_MAX_BYTES',
+                            1024 * 1024 * 1024),
+            help='Предельный размер кэша в байтах',
+        )
+
+    def handle(self, *args, **options):
+        entries = []
+        total = 0
+        now = time.time()
+        for root, _, files in os.walk(resize.cache_dir()):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.startswith('tmp') and (
+                        now - stat.st_mtime > stale_temp_age):
+                    os.remove(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        removed = 0
+        # Время изменения обновляется при каждом обращении, так что
+        # первыми уходят давно не запрошенные картинки.
+        for _, size, path in sorted(entries):
+            if total <= options['max_bytes']:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено картинок: {removed}, размер кэша: {total} байт'))
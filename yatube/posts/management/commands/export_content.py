@@ -0,0 +1,51 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import Group
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает посты и комментарии пользователя или '
+            'группы в NDJSON или ZIP')
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--user', help='username автора')
+        source.add_argument('--group', help='slug группы')
+        parser.add_argument(
+            '--format', choices=tuple(export.content_types),
+            default='ndjson', help='Формат выгрузки',
+        )
+        parser.add_argument(
+            '--images', action='store_true',
+            help='Положить в ZIP файлы картинок',
+        )
+        parser.add_argument(
+            '--output', help='Файл выгрузки; по умолчанию stdout',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options['user']:
+                content = export.user_export(
+                    User.objects.get(username=options['user']))
+            else:
+                content = export.group_export(
+                    Group.objects.get(slug=options['group']))
+        except (User.DoesNotExist, Group.DoesNotExist):
+            raise CommandError('Пользователь или группа не найдены')
+        output = (
+            open(options['output'], 'wb') if options['output']
+            else sys.stdout.buffer)
+        try:
+            for chunk in export.stream(
+                    content, options['format'], options['images']):
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,55 @@
+from concurrent.futures import wait
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Нарезает недостающие миниатюры и варианты картинок постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Сколько постов проверять и нарезать за один проход',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=thumbnails.workers(),
+            help='Сколько процессов режут картинки; 0 — в этом процессе',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        executor = None
+        if options['workers'] > 0:
+            executor = thumbnails.process_pool(options['workers'])
+        posts = Post.objects.exclude(image='').order_by('pk')
+        last_id = 0
+        generated = 0
+        while True:
+            batch = list(
+                posts.filter(pk__gt=last_id).only('pk', 'image')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            thumbnails.prime_thumbnails(batch)
+            missing = [
+                post for post in batch
+                if not all(post.primed_thumbnails.values())
+            ]
+            if executor is None:
+                for post in missing:
+                    thumbnails.generate(post.pk, post.image.name)
+            else:
+                wait([
+                    executor.submit(thumbnails.generate_in_worker,
+                                    post.pk, post.image.name)
+                    for post in missing
+                ])
+            generated += len(missing)
+        if executor is not None:
+            executor.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f'Нарезаны картинки постов: {generated}'))
@@ -0,0 +1,247 @@
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import tagged_cache
+from core.bulk import original_pub_dates, reset_sequences
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def read_records(stream, input_format):
+    """Записи выгрузки по одной, не читая файл целиком."""
+    if input_format == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: value for key, value in row.items() if value}
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_checkpoint(path):
+    """Число загруженных записей и id постов, пропущенных из-за конфликта.
+
+    Без этих id комментарии к таким постам после продолжения загрузки
+    прицепились бы к чужим постам с теми же id.
+    """
+    try:
+        with open(path) as checkpoint:
+            state = json.load(checkpoint)
+    except FileNotFoundError:
+        return 0, set()
+    return state['records'], set(state.get('conflicting_posts', ()))
+
+
+def write_checkpoint(path, records, conflicting_posts):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as checkpoint:
+        json.dump({
+            'records': records,
+            'conflicting_posts': sorted(conflicting_posts),
+        }, checkpoint)
+    os.replace(temp_path, path)
+
+
+def split_loaded(model, objects, fields):
+    """Делит объекты с id из выгрузки на новые и конфликтующие.
+
+    Строка с тем же id и теми же полями уже загружена прошлым запуском и
+    просто отбрасывается. Строка с тем же id, но другими полями — чужая
+    запись; её id занят, и объект попадает в конфликты.
+    """
+    stored = {
+        row[0]: row[1:] for row in model.objects.filter(
+            pk__in=[obj.pk for obj in objects]).values_list('pk', *fields)
+    }
+    fresh, conflicts = {}, []
+    for obj in objects:
+        row = stored.get(obj.pk)
+        values = tuple(getattr(obj, field) for field in fields)
+        if obj.pk in fresh or (row is not None and row != values):
+            conflicts.append(obj)
+        elif row is None:
+            fresh[obj.pk] = obj
+    return list(fresh.values()), conflicts
+
+
+def pub_date(record):
+    if not record.get('pub_date'):
+        return timezone.now()
+    value = parse_datetime(record['pub_date'])
+    if value is None:
+        raise ValueError(f'Неверная дата {record["pub_date"]}')
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии и подписки из JSONL или CSV пачками '
+        'bulk_create. Записи: post (id, author, group, text, pub_date), '
+        'comment (id, post, author, text, pub_date), follow (user, '
+        'author); тип — в поле type, авторы и группы — по username и slug. '
+        'Комментарии должны идти после своих постов. Записи, чей id уже '
+        'занят другим постом или комментарием, пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл выгрузки или - для stdin')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='Формат; по умолчанию по расширению файла',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько записей писать одной транзакцией',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл с числом загруженных записей и id пропущенных '
+                 'постов для продолжения после сбоя',
+        )
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не пересчитывать счётчики и ленты подписок после загрузки',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl')
+        checkpoint = options['checkpoint']
+        done, self.conflicting_posts = (
+            read_checkpoint(checkpoint) if checkpoint else (0, set()))
+        # Авторы и группы ищутся по словарям в памяти, а не запросом на
+        # каждую запись.
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.skipped = 0
+        self.touched_users = set()
+        self.touched_groups = set()
+        self.touched_posts = set()
+        stream = (
+            sys.stdin if path == '-'
+            else open(path, newline='', encoding='utf-8'))
+        loaded = 0
+        started = time.monotonic()
+        try:
+            records = islice(read_records(stream, input_format), done, None)
+            with original_pub_dates(Post, Comment):
+                while True:
+                    batch = list(islice(records, options['batch_size']))
+                    if not batch:
+                        break
+                    with transaction.atomic():
+                        self.load_batch(batch)
+                    done += len(batch)
+                    loaded += len(batch)
+                    if checkpoint:
+                        write_checkpoint(
+                            checkpoint, done, self.conflicting_posts)
+                    rate = loaded / max(time.monotonic() - started, 1e-6)
+                    self.stdout.write(
+                        f'Записей: {done}, {rate:.0f} в секунду')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.finish(options['skip_rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено записей: {loaded}, пропущено: {self.skipped}'))
+
+    def load_batch(self, batch):
+        posts, comments, follows = [], [], []
+        for record in batch:
+            try:
+                self.collect(record, posts, comments, follows)
+            except (KeyError, ValueError, TypeError) as error:
+                self.skipped += 1
+                self.stderr.write(f'Пропущена запись {record}: {error}')
+        # Посты и комментарии сохраняют id из выгрузки, поэтому пачку,
+        # закоммиченную перед сбоем, но не попавшую в checkpoint, можно
+        # безопасно загрузить повторно: её строки уже совпадают с базой.
+        posts, conflicts = split_loaded(Post, posts, ('author_id', 'text'))
+        self.conflicting_posts.update(post.pk for post in conflicts)
+        self.skip_conflicts('Пост', conflicts)
+        # Комментарии к постам, которых нет ни в базе, ни в пачке, сорвали
+        # бы коммит пачки на проверке внешнего ключа, а к постам с занятым
+        # id — прицепились бы к чужому посту.
+        post_ids = {comment.post_id for comment in comments}
+        known = {post.pk for post in posts} | set(
+            Post.objects.filter(pk__in=post_ids)
+            .values_list('pk', flat=True))
+        known -= self.conflicting_posts
+        valid = [comment for comment in comments if comment.post_id in known]
+        self.skipped += len(comments) - len(valid)
+        valid, conflicts = split_loaded(
+            Comment, valid, ('post_id', 'author_id', 'text'))
+        self.skip_conflicts('Комментарий', conflicts)
+        self.touched_posts.update(comment.post_id for comment in valid)
+        Post.objects.bulk_create(posts)
+        Comment.objects.bulk_create(valid)
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+
+    def skip_conflicts(self, label, objects):
+        self.skipped += len(objects)
+        for obj in objects:
+            self.stderr.write(f'{label} {obj.pk} пропущен: id уже занят')
+
+    def collect(self, record, posts, comments, follows):
+        kind = record['type']
+        author_id = self.users.get(record.get('author'))
+        if kind == 'post':
+            slug = record.get('group')
+            group_id = self.groups.get(slug) if slug else None
+            if author_id is None or (slug and group_id is None):
+                raise ValueError('нет автора или группы')
+            posts.append(Post(
+                pk=int(record['id']), author_id=author_id,
+                group_id=group_id, text=record['text'],
+                pub_date=pub_date(record)))
+            self.touched_users.add(author_id)
+            if slug:
+                self.touched_groups.add(group_id)
+        elif kind == 'comment':
+            if author_id is None:
+                raise ValueError('нет автора')
+            comments.append(Comment(
+                pk=int(record['id']), post_id=int(record['post']),
+                author_id=author_id, text=record['text'],
+                pub_date=pub_date(record)))
+        elif kind == 'follow':
+            user_id = self.users.get(record.get('user'))
+            if None in (user_id, author_id) or user_id == author_id:
+                raise ValueError('нет пользователя или подписка на себя')
+            follows.append(Follow(user_id=user_id, author_id=author_id))
+            self.touched_users.update((user_id, author_id))
+        else:
+            raise ValueError(f'неизвестный тип {kind}')
+
+    def finish(self, skip_rebuild):
+        reset_sequences(Post, Comment)
+        # bulk_create обходит сигналы, поэтому счётчики, ленты подписок и
+        # кэш страниц обновляются здесь.
+        if not skip_rebuild:
+            call_command('reconcile_counters', stdout=self.stdout)
+            call_command('rebuild_feeds', stdout=self.stdout)
+        tagged_cache.invalidate(
+            'feed:index',
+            *(f'profile:{user_id}' for user_id in self.touched_users),
+            *(f'group:{group_id}' for group_id in self.touched_groups),
+            *(f'post:{post_id}' for post_id in self.touched_posts),
+        )
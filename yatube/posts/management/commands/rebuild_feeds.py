@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed
+from posts.models import FeedEntry, Follow
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок всех пользователей с нуля'
+
+    def handle(self, *args, **options):
+        # Здесь же популярные авторы, потерявшие подписчиков, переводятся
+        # обратно на раскладку: при отписке этого не делается.
+        promoted, demoted = feed.update_celebrities()
+        # Каждая лента пересобирается в своей транзакции, так что читатели
+        # не видят пустых лент, пока идёт пересборка остальных.
+        user_ids = (
+            Follow.objects.order_by('user_id')
+            .values_list('user_id', flat=True)
+            .distinct()
+        )
+        total = 0
+        for user_id in user_ids.iterator():
+            feed.rebuild_feed(user_id)
+            total += 1
+        # Ленты тех, кто отписался от всех, пересборка выше не трогает.
+        FeedEntry.objects.exclude(
+            user_id__in=Follow.objects.values('user_id')).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны: {total}, записей: '
+            f'{FeedEntry.objects.count()}; популярных авторов '
+            f'прибавилось: {promoted}, убавилось: {demoted}'
+        ))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс постов порциями'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько постов переиндексировать за одну транзакцию',
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError(
+                'Полнотекстовый поиск работает только на SQLite')
+        batch_size = options['batch_size']
+        with connection.cursor() as cursor:
+            cursor.execute(search.create_table_sql)
+        search.install_triggers()
+        # Новые посты индексируют триггеры, поэтому хватает диапазона
+        # id, существовавших на момент запуска, и хвоста индекса за ним.
+        last_id = max(
+            Post.objects.aggregate(last=Max('pk'))['last'] or 0,
+            self.indexed_max_id(),
+        )
+        total = 0
+        for first_id in range(1, last_id + 1, batch_size):
+            search.reindex_range(first_id, first_id + batch_size - 1)
+            total += 1
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {search.table}({search.table}) "
+                f"VALUES ('optimize')")
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс пересобран, порций: {total}'))
+
+    def indexed_max_id(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT MAX(rowid) FROM {search.table}')
+            return cursor.fetchone()[0] or 0
@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from posts.models import Follow, Post, UserCounters
+
+User = get_user_model()
+
+
+def _id_batches(queryset, batch_size):
+    """Идёт по id диапазонами, не держа долгих транзакций и блокировок."""
+    last_id = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last_id)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def _count_by(queryset, field, ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': ids})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values_list(field, 'total')
+    )
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные счётчики с данными и чинит расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк сверять за один проход',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users_fixed = self.reconcile_users(batch_size)
+        posts_fixed = self.reconcile_posts(batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: пользователей {users_fixed}, '
+            f'постов {posts_fixed}'
+        ))
+
+    def reconcile_users(self, batch_size):
+        fixed = 0
+        fields = ('posts_count', 'followers_count', 'following_count')
+        for ids in _id_batches(User.objects.all(), batch_size):
+            actual = {
+                'posts_count': _count_by(Post.objects, 'author_id', ids),
+                'followers_count': _count_by(Follow.objects, 'author_id', ids),
+                'following_count': _count_by(Follow.objects, 'user_id', ids),
+            }
+            stored = UserCounters.objects.in_bulk(ids)
+            missing = []
+            for user_id in ids:
+                values = {
+                    field: actual[field].get(user_id, 0) for field in fields
+                }
+                counters = stored.get(user_id)
+                if counters is None:
+                    if any(values.values()):
+                        missing.append(UserCounters(user_id=user_id, **values))
+                    continue
+                seen = {field: getattr(counters, field) for field in fields}
+                if seen != values:
+                    # Сравнение со старым значением не затирает
+                    # инкременты, случившиеся после подсчёта.
+                    fixed += UserCounters.objects.filter(
+                        user_id=user_id, **seen).update(**values)
+            UserCounters.objects.bulk_create(missing, ignore_conflicts=True)
+            fixed += len(missing)
+        return fixed
+
+    def reconcile_posts(self, batch_size):
+        fixed = 0
+        for ids in _id_batches(Post.objects.all(), batch_size):
+            actual = (
+                Post.objects.filter(pk__in=ids)
+                .order_by()
+                .annotate(total=Count('comments'))
+                .values_list('pk', 'comments_count', 'total')
+            )
+            for pk, stored, total in actual:
+                if stored != total:
+                    fixed += Post.objects.filter(
+                        pk=pk, comments_count=stored,
+                    ).update(comments_count=total)
+        return fixed
@@ -0,0 +1,161 @@
+import os
+import random
+import time
+from concurrent.futures import as_completed
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from core import tagged_cache
+from core.bulk import batch_size, reset_sequences
+from posts import seed
+from posts.models import Comment, Group, Post
+from posts.thumbnails import process_pool
+from posts.uploads import placeholder_colour
+
+User = get_user_model()
+
+image_sizes = ((800, 600), (1200, 800), (600, 900), (1024, 1024))
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, подписками и комментариями со степенным '
+            'распределением популярности')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows-per-user', type=int, default=10,
+            help='Среднее число подписок пользователя',
+        )
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Сколько разных картинок-заглушек раздать постам',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней разбросать даты')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers', type=int,
+            help='Число процессов; 0 — писать в этом процессе. По '
+                 'умолчанию по числу ядер, а для SQLite, который пускает '
+                 'только одного писателя, 0',
+        )
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не пересчитывать счётчики и ленты подписок',
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers is None:
+            workers = 0 if connection.vendor == 'sqlite' else os.cpu_count()
+        users = options['users']
+        # Постам нужны авторы, а комментариям — посты и авторы.
+        posts = options['posts'] if users else 0
+        plan = seed.Plan(
+            seed=options['seed'],
+            users=users,
+            groups=options['groups'],
+            posts=posts,
+            comments=options['comments'] if posts else 0,
+            follows_per_user=options['follows_per_user'],
+            images=self.make_images(options['images'], options['seed']),
+            user_base=next_id(User),
+            group_base=next_id(Group),
+            post_base=next_id(Post),
+            comment_base=next_id(Comment),
+            since=timezone.now() - timedelta(days=options['days']),
+            days=options['days'],
+            batch_size=options['batch_size'],
+        )
+        self.make_groups(plan)
+        stages = (
+            ('users', plan.users),
+            ('posts', plan.posts),
+            ('comments', plan.comments),
+            ('follows', plan.users if plan.users > 1 else 0),
+        )
+        executor = process_pool(workers) if workers else None
+        try:
+            for kind, total in stages:
+                self.run_stage(executor, kind, plan, total)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        reset_sequences(User, Group, Post, Comment)
+        if not options['skip_rebuild']:
+            call_command('reconcile_counters', stdout=self.stdout)
+            call_command('rebuild_feeds', stdout=self.stdout)
+        tagged_cache.invalidate('feed:index')
+
+    def run_stage(self, executor, kind, plan, total):
+        tasks = seed.chunks(total)
+        if executor is None:
+            results = (seed.seed_chunk(kind, plan, *task) for task in tasks)
+        else:
+            futures = [
+                executor.submit(seed.seed_chunk_in_worker, kind, plan, *task)
+                for task in tasks
+            ]
+            results = (future.result() for future in as_completed(futures))
+        started = time.monotonic()
+        done = 0
+        for rows in results:
+            done += rows
+            rate = done / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(f'{kind}: {done}, {rate:.0f} строк в секунду')
+
+    def make_groups(self, plan):
+        fake = Faker('ru_RU')
+        fake.seed_instance(f'{plan.seed}:groups')
+        groups = [
+            Group(pk=plan.group_base + index,
+                  title=f'{fake.word().capitalize()} {index}',
+                  slug=f'seed-{plan.group_base + index}',
+                  description=fake.sentence())
+            for index in range(plan.groups)
+        ]
+        Group.objects.bulk_create(
+            groups, batch_size=batch_size(Group, groups, plan.batch_size))
+
+    def make_images(self, count, seed_value):
+        """Картинки-заглушки: (имя, ширина, высота, цвет-заглушка)."""
+        rng = random.Random(f'{seed_value}:images')
+        storage = Post._meta.get_field('image').storage
+        images = []
+        for index in range(count):
+            size = rng.choice(image_sizes)
+            image = Image.new('RGB', size, tuple(
+                rng.randrange(256) for _ in range(3)))
+            draw = ImageDraw.Draw(image)
+            for _ in range(5):
+                x, y = rng.randrange(size[0]), rng.randrange(size[1])
+                radius = rng.randrange(50, 300)
+                draw.ellipse(
+                    (x - radius, y - radius, x + radius, y + radius),
+                    fill=tuple(rng.randrange(256) for _ in range(3)))
+            buffer = BytesIO()
+            image.save(buffer, 'JPEG', quality=80)
+            name = storage.save(
+                f'posts/seed-{index}.jpg', ContentFile(buffer.getvalue()))
+            images.append((name, *size, placeholder_colour(image)))
+        return images
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+# SQL записан здесь, а не берётся из posts.search: миграция должна
+# делать то же самое, как бы потом ни менялся код приложения.
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_search USING fts5("
+    "text, tokenize='unicode61 remove_diacritics 2')"
+)
+FILL_TABLE = (
+    'INSERT INTO posts_post_search(rowid, text) '
+    'SELECT id, text FROM posts_post'
+)
+CREATE_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS posts_post_search_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_search(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_post_search_delete
+    AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_post_search_update
+    AFTER UPDATE OF text ON posts_post BEGIN
+        UPDATE posts_post_search SET text = new.text WHERE rowid = old.id;
+    END""",
+)
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+        cursor.execute(FILL_TABLE)
+        for sql in CREATE_TRIGGERS:
+            cursor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for suffix in ('insert', 'delete', 'update'):
+            cursor.execute(
+                f'DROP TRIGGER IF EXISTS posts_post_search_{suffix}')
+        cursor.execute('DROP TABLE IF EXISTS posts_post_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_card_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_celebrities(apps, schema_editor):
+    # До этой миграции популярность считалась по порогу при каждом запросе.
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    UserCounters.objects.filter(
+        followers_count__gte=getattr(settings, 'FEED_FANOUT_THRESHOLD', 1000),
+    ).update(pull_feed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_comment_post_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounters',
+            name='pull_feed',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Посты подмешиваются в ленты при чтении'),
+        ),
+        migrations.RunPython(mark_celebrities, migrations.RunPython.noop),
+    ]
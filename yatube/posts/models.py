@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
-from core.models import PubDateModel
+from core.models import AtomicSaveModel, PubDateModel
+from core.storage import ContentAddressedStorage
 from django.db.models.deletion import CASCADE
 
 User = get_user_model()
@@ -25,7 +26,24 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
-class Post(PubDateModel):
+class PostQuerySet(models.QuerySet):
+    # Поля, которые читают карточка поста в ленте и паджинатор.
+    feed_fields = (
+        'id', 'text', 'pub_date', 'image', 'image_width', 'image_height',
+        'image_placeholder', 'author_id', 'group_id', 'card_version',
+        'author__username', 'author__first_name', 'author__last_name',
+        'group__slug',
+    )
+
+    def for_feed(self):
+        return self.select_related('author', 'group').only(*self.feed_fields)
+
+    def for_detail(self):
+        # Комментарии читаются порциями отдельно, см. get_comments_page.
+        return self.select_related('author', 'author__counters', 'group')
+
+
+class Post(AtomicSaveModel, PubDateModel):
 
     text = models.TextField(verbose_name='Текст поста',
                             help_text='Текст поста')
@@ -42,13 +60,53 @@ class Post(PubDateModel):
         verbose_name='Автор',
         help_text='Автор')
 
+    # Одинаковые картинки хранятся одним файлом; ссылки на него — строки
+    # Post с тем же image (см. posts.blobs).
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
+        db_index=True,
         blank=True)
+    # Размеры и цвет-заглушка запоминаются при загрузке, чтобы шаблоны не
+    # открывали файл. width_field/height_field не подходят: для строк без
+    # размеров ImageField читает файл при каждом создании объекта.
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        null=True,
+        blank=True,
+        editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        null=True,
+        blank=True,
+        editable=False)
+    image_placeholder = models.CharField(
+        'Цвет-заглушка картинки',
+        max_length=7,
+        blank=True,
+        editable=False)
+    comments_count = models.IntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False)
+    card_version = models.IntegerField(
+        'Версия карточки',
+        default=0,
+        editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_feed_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_feed_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_feed_idx'),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -56,7 +114,7 @@ class Post(PubDateModel):
         return self.text[:15]
 
 
-class Comment(PubDateModel):
+class Comment(AtomicSaveModel, PubDateModel):
     post = models.ForeignKey(
         Post,
         related_name='comments',
@@ -77,12 +135,16 @@ class Comment(PubDateModel):
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['post', '-pub_date', '-id'],
+                         name='comment_post_idx'),
+        ]
 
     def __str__(self):
         return f"Запись: '{self.post}', автор: '{self.author}'"
 
 
-class Follow(models.Model):
+class Follow(AtomicSaveModel):
     user = models.ForeignKey(
         User,
         on_delete=CASCADE,
@@ -105,3 +167,68 @@ class Follow(models.Model):
                 name="unique_pair"
             ),
         ]
+
+
+class FeedEntry(models.Model):
+    """Материализованная лента подписок: строка на пару читатель-пост."""
+    user = models.ForeignKey(
+        User,
+        on_delete=CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=CASCADE,
+        related_name='+',
+        verbose_name='Автор поста'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='feed_entry_user_post_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_entry_user_author_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_feed_entry'
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+
+class UserCounters(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Поддерживаются обработчиками сигналов Post и Follow, расхождения
+    исправляет команда reconcile_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.IntegerField('Число постов', default=0)
+    followers_count = models.IntegerField('Число подписчиков', default=0)
+    following_count = models.IntegerField('Число подписок', default=0)
+    pull_feed = models.BooleanField(
+        'Посты подмешиваются в ленты при чтении', default=False,
+        editable=False)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
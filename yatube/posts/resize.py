@@ -0,0 +1,140 @@
+"""Картинки произвольного размера по подписанным ссылкам.
+
+Ссылка /media/r/<подпись>/<геометрия>/<путь> подписана HMAC от геометрии
+и пути, так что размеры выбирают только шаблоны, а не посетители.
+Геометрия — «ШxВ», с суффиксом «c» картинка обрезается по центру.
+
+Результат кладётся в RESIZE_CACHE_DIR под именем из хэша содержимого
+оригинала и геометрии: одинаковые картинки под разными именами делят
+одну запись. Повторные запросы отдаются веб-сервером через
+RESIZE_SENDFILE_HEADER (X-Accel-Redirect или X-Sendfile), если он задан.
+Размер кэша держит в рамках команда evict_resized_images.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils._os import safe_join
+from PIL import Image, ImageOps
+
+from .uploads import quality, save_options
+
+SIGNATURE_SALT = 'posts.resize'
+GEOMETRY_RE = re.compile(r'^(?P<width>\d+)x(?P<height>\d+)(?P<crop>c?)$')
+DIGEST_PREFIX = 'resize_source:'
+extensions = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+class ResizeError(Exception):
+    pass
+
+
+def cache_dir():
+    return getattr(settings, 'RESIZE_CACHE_DIR',
+                   os.path.join(settings.BASE_DIR, 'resized'))
+
+
+def max_edge():
+    return getattr(settings, 'RESIZE_MAX_EDGE', 2048)
+
+
+def sign(geometry, name):
+    value = f'{geometry}/{name}'
+    return salted_hmac(SIGNATURE_SALT, value).hexdigest()[:20]
+
+
+def check_signature(signature, geometry, name):
+    return constant_time_compare(signature, sign(geometry, name))
+
+
+def resized_url(name, geometry):
+    return reverse('resized_image', kwargs={
+        'signature': sign(geometry, name),
+        'geometry': geometry,
+        'name': name,
+    })
+
+
+def parse_geometry(geometry):
+    """(ширина, высота, обрезать ли) или ResizeError."""
+    match = GEOMETRY_RE.match(geometry)
+    if match is None:
+        raise ResizeError(f'Неверная геометрия {geometry}')
+    width, height = int(match['width']), int(match['height'])
+    if not 0 < width <= max_edge() or not 0 < height <= max_edge():
+        raise ResizeError(f'Геометрия {geometry} больше {max_edge()}')
+    return width, height, bool(match['crop'])
+
+
+def _source_info(path):
+    """(хэш содержимого, формат) оригинала; пересчитываются, только если
+    у файла поменялись размер или время изменения."""
+    stat = os.stat(path)
+    key = (f'{DIGEST_PREFIX}'
+           f'{hashlib.md5(path.encode()).hexdigest()}:'
+           f'{stat.st_size}:{stat.st_mtime_ns}')
+    info = cache.get(key)
+    if info is None:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as source:
+            for chunk in iter(lambda: source.read(64 * 1024), b''):
+                hasher.update(chunk)
+        with Image.open(path) as image:
+            info = hasher.hexdigest(), image.format
+        cache.set(key, info, None)
+    return info
+
+
+def _cache_path(digest, geometry, image_format):
+    key = hashlib.sha256(f'{digest}:{geometry}'.encode()).hexdigest()
+    return os.path.join(key[:2], key[2:4], f'{key}.{extensions[image_format]}')
+
+
+def _resize(source_path, target_path, width, height, crop):
+    with Image.open(source_path) as image:
+        image_format = image.format
+        image = ImageOps.exif_transpose(image)
+        if crop:
+            image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            image.thumbnail((width, height), Image.LANCZOS)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        # Пишем во временный файл рядом и переименовываем, чтобы
+        # параллельный запрос не отдал недописанную картинку.
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target_path))
+        try:
+            with os.fdopen(fd, 'wb') as target:
+                image.save(target, format=image_format,
+                           **save_options[image_format](quality()))
+            # mkstemp создаёт файл только для владельца, а отдаёт его
+            # веб-сервер.
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, target_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+def get_resized(name, geometry):
+    """Путь к уменьшенной картинке относительно cache_dir(); режет её при
+    первом обращении. Бросает ResizeError и OSError."""
+    width, height, crop = parse_geometry(geometry)
+    source_path = safe_join(settings.MEDIA_ROOT, name)
+    digest, image_format = _source_info(source_path)
+    if image_format not in extensions:
+        raise ResizeError(f'Формат {image_format} не поддерживается')
+    relative = _cache_path(digest, geometry, image_format)
+    target_path = os.path.join(cache_dir(), relative)
+    if os.path.exists(target_path):
+        # Время изменения служит отметкой последнего обращения для LRU.
+        os.utime(target_path)
+    else:
+        _resize(source_path, target_path, width, height, crop)
+    return relative
@@ -0,0 +1,154 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Индекс posts_post_search — FTS5-таблица с собственной копией текста:
+в отличие от external content, строку в ней можно удалить по rowid, не
+зная старого текста, и индекс можно пересобирать порциями без остановки
+записи. Синхронизацию с Post.text ведут триггеры, поэтому индекс видит и
+bulk_create, и update().
+
+SQLite пересоздаёт таблицу при некоторых миграциях и теряет её триггеры,
+поэтому install_triggers() вызывается после каждой миграции приложения.
+Для других СУБД индекс не создаётся и поиск ничего не находит.
+"""
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .utils import CURSOR_NEXT, CursorPaginator, max_on_page
+
+table = 'posts_post_search'
+snippet_tokens: int = 16
+# Служебные символы вместо тегов: сниппет сначала экранируется,
+# а уже потом они заменяются на <mark>.
+_mark_open, _mark_close = '\x02', '\x03'
+
+create_table_sql = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+    "text, tokenize='unicode61 remove_diacritics 2')"
+)
+triggers_sql = (
+    f"""CREATE TRIGGER IF NOT EXISTS {table}_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {table}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {table}_delete
+    AFTER DELETE ON posts_post BEGIN
+        DELETE FROM {table} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {table}_update
+    AFTER UPDATE OF text ON posts_post BEGIN
+        UPDATE {table} SET text = new.text WHERE rowid = old.id;
+    END""",
+)
+
+
+def is_supported(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def install_triggers(using=connection):
+    """Создаёт недостающие триггеры, если индекс уже есть."""
+    if not is_supported(using) or (
+            table not in using.introspection.table_names()):
+        return
+    with using.cursor() as cursor:
+        for sql in triggers_sql:
+            cursor.execute(sql)
+
+
+def reindex_range(first_id, last_id, using=connection):
+    """Переиндексирует посты с id из [first_id, last_id] и убирает из
+    индекса удалённые."""
+    with transaction.atomic(using=using.alias), using.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE rowid BETWEEN %s AND %s',
+            [first_id, last_id])
+        cursor.execute(
+            f'INSERT INTO {table}(rowid, text) SELECT id, text '
+            f'FROM posts_post WHERE id BETWEEN %s AND %s',
+            [first_id, last_id])
+
+
+def match_expression(query):
+    """Запрос пользователя в выражение MATCH: все слова по префиксу.
+
+    Каждое слово берётся в кавычки, так что операторы и спецсимволы FTS5
+    из строки поиска не ломают запрос.
+    """
+    terms = []
+    for word in query.split():
+        word = word.replace('"', '""')
+        terms.append(f'"{word}"*')
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(_mark_open, '<mark>')
+        .replace(_mark_close, '</mark>')
+    )
+
+
+def matching_ids(query):
+    """Подзапрос id постов, подходящих под запрос, для filter(pk__in=)."""
+    return RawSQL(
+        f'SELECT rowid FROM {table} WHERE {table} MATCH %s',
+        [match_expression(query)],
+    )
+
+
+class SearchPaginator(CursorPaginator):
+    """Результаты поиска по релевантности (bm25) с курсором по (rank, id).
+
+    Посты на странице получают атрибуты search_rank и search_snippet.
+    Ранги пересчитываются при изменении индекса, поэтому при листании
+    во время правок пост может сдвинуться между страницами.
+    """
+
+    def __init__(self, query, per_page=max_on_page):
+        self.match = match_expression(query)
+        super().__init__(None, per_page)
+
+    def fetch(self, limit, offset=0, direction=CURSOR_NEXT, position=None):
+        if not self.match or not is_supported():
+            return []
+        # Лучшие совпадения — с наименьшим bm25.
+        lookup, order = ('>', 'ASC') if direction == CURSOR_NEXT else (
+            '<', 'DESC')
+        where = f'{table} MATCH %s'
+        params = [self.match]
+        if position is not None:
+            where += (f' AND (score {lookup} %s'
+                      f' OR (score = %s AND rowid {lookup} %s))')
+            rank, pk = position
+            params.extend([rank, rank, pk])
+        sql = (
+            f'SELECT rowid, bm25({table}) AS score, '
+            f'snippet({table}, 0, %s, %s, %s, %s) '
+            f'FROM {table} WHERE {where} '
+            f'ORDER BY score {order}, rowid {order} LIMIT %s OFFSET %s'
+        )
+        params = [_mark_open, _mark_close, '…', snippet_tokens,
+                  *params, limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            hits = cursor.fetchall()
+        posts = Post.objects.for_feed().in_bulk([pk for pk, _, _ in hits])
+        rows = []
+        for pk, rank, snippet in hits:
+            post = posts.get(pk)
+            if post is None:
+                continue
+            post.search_rank = rank
+            post.search_snippet = highlight(snippet)
+            rows.append(post)
+        return rows
+
+    def cursor_value(self, obj):
+        return repr(obj.search_rank)
+
+    def parse_cursor_value(self, value):
+        return float(value)
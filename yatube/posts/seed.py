@@ -0,0 +1,185 @@
+"""Генерация больших синтетических данных для команды seed_yatube.
+
+Число постов у авторов, подписчиков у авторов и комментариев у постов
+распределено по степенному закону: немногие популярные авторы и посты
+собирают большую часть. Строки генерируются порциями по chunk_rows, и
+каждая порция берёт своё зерно из общего seed, вида строк и номера
+порции, а id задаются явно. Поэтому результат не зависит от числа
+процессов и порядка, в котором они разбирают порции.
+"""
+import functools
+import math
+import random
+from collections import namedtuple
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections, transaction
+from faker import Faker
+
+from core.bulk import batch_size, original_pub_dates
+from .models import Comment, Follow, Post
+
+User = get_user_model()
+
+chunk_rows: int = 20000
+# Показатель степенного закона: i-й по популярности встречается примерно
+# в i ** exponent раз реже первого.
+exponent: float = 1.2
+group_share: float = 0.7
+image_share: float = 0.3
+vocabulary_size: int = 3000
+
+Plan = namedtuple('Plan', (
+    'seed', 'users', 'groups', 'posts', 'comments', 'follows_per_user',
+    'images', 'user_base', 'group_base', 'post_base', 'comment_base',
+    'since', 'days', 'batch_size',
+))
+
+
+def power_law_index(rng, n):
+    """Индекс из [0, n), распределённый по степенному закону."""
+    power = 1 - exponent
+    x = (1 + rng.random() * ((n + 1) ** power - 1)) ** (1 / power)
+    return min(int(x) - 1, n - 1)
+
+
+@functools.lru_cache()
+def _stride(n):
+    stride = 2654435761 % n or 1
+    while math.gcd(stride, n) != 1:
+        stride += 1
+    return stride
+
+
+def scatter(index, n):
+    """Перестановка [0, n): популярными оказываются не первые по id."""
+    return index * _stride(n) % n
+
+
+@functools.lru_cache()
+def vocabulary(seed):
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    return fake.words(vocabulary_size)
+
+
+def text(rng, words):
+    return ' '.join(rng.choices(words, k=rng.randint(5, 60))).capitalize()
+
+
+def pub_date(rng, plan):
+    return plan.since + timedelta(seconds=rng.randrange(plan.days * 86400))
+
+
+def chunks(total):
+    """(номер, начало, число строк) порций для total строк."""
+    return [
+        (number, start, min(chunk_rows, total - start))
+        for number, start in enumerate(range(0, total, chunk_rows))
+    ]
+
+
+def _rng(plan, kind, number):
+    return random.Random(f'{plan.seed}:{kind}:{number}')
+
+
+def _users(plan, number, start, count):
+    fake = Faker('ru_RU')
+    fake.seed_instance(f'{plan.seed}:users:{number}')
+    password = make_password(None)
+    return [
+        User(pk=plan.user_base + index,
+             username=f'{fake.user_name()}{plan.user_base + index}',
+             first_name=fake.first_name(), last_name=fake.last_name(),
+             password=password)
+        for index in range(start, start + count)
+    ]
+
+
+def _posts(plan, number, start, count):
+    rng = _rng(plan, 'posts', number)
+    words = vocabulary(plan.seed)
+    posts = []
+    for index in range(start, start + count):
+        author = scatter(power_law_index(rng, plan.users), plan.users)
+        post = Post(
+            pk=plan.post_base + index,
+            author_id=plan.user_base + author,
+            text=text(rng, words),
+            pub_date=pub_date(rng, plan),
+        )
+        if plan.groups and rng.random() < group_share:
+            post.group_id = plan.group_base + rng.randrange(plan.groups)
+        if plan.images and rng.random() < image_share:
+            (post.image, post.image_width, post.image_height,
+             post.image_placeholder) = rng.choice(plan.images)
+        posts.append(post)
+    return posts
+
+
+def _comments(plan, number, start, count):
+    rng = _rng(plan, 'comments', number)
+    words = vocabulary(plan.seed)
+    return [
+        Comment(
+            pk=plan.comment_base + index,
+            post_id=plan.post_base + scatter(
+                power_law_index(rng, plan.posts), plan.posts),
+            author_id=plan.user_base + rng.randrange(plan.users),
+            text=text(rng, words),
+            pub_date=pub_date(rng, plan),
+        )
+        for index in range(start, start + count)
+    ]
+
+
+def _follows(plan, number, start, count):
+    """Подписки читателей start..start+count: их число у читателя и
+    популярность авторов — по степенному закону."""
+    rng = _rng(plan, 'follows', number)
+    follows = []
+    for user in range(start, start + count):
+        # Среднее paretovariate(1.5) — 3.
+        degree = min(int(rng.paretovariate(1.5) * plan.follows_per_user / 3),
+                     plan.users - 1)
+        authors = set()
+        for _ in range(degree * 2):
+            if len(authors) >= degree:
+                break
+            author = scatter(power_law_index(rng, plan.users), plan.users)
+            if author != user:
+                authors.add(author)
+        follows.extend(
+            Follow(user_id=plan.user_base + user,
+                   author_id=plan.user_base + author)
+            for author in sorted(authors)
+        )
+    return follows
+
+
+kinds = {
+    'users': (User, _users),
+    'posts': (Post, _posts),
+    'comments': (Comment, _comments),
+    'follows': (Follow, _follows),
+}
+
+
+def seed_chunk(kind, plan, number, start, count):
+    """Генерирует и пишет одну порцию; возвращает число строк."""
+    model, generate = kinds[kind]
+    rows = generate(plan, number, start, count)
+    with original_pub_dates(Post, Comment), transaction.atomic():
+        model.objects.bulk_create(
+            rows, batch_size=batch_size(model, rows, plan.batch_size),
+            ignore_conflicts=model is Follow)
+    return len(rows)
+
+
+def seed_chunk_in_worker(kind, plan, number, start, count):
+    try:
+        return seed_chunk(kind, plan, number, start, count)
+    finally:
+        close_old_connections()
@@ -0,0 +1,153 @@
+from django.db import connections
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from core import tagged_cache
+from . import blobs, cards, counters, feed, search
+from .models import Comment, Follow, Group, Post, User
+
+
+def _card_fields_changed(instance, fields, update_fields):
+    if instance.pk is None:
+        return False
+    if update_fields is not None and not set(update_fields) & set(fields):
+        return False
+    stored = (
+        type(instance).objects.filter(pk=instance.pk)
+        .values_list(*fields).first()
+    )
+    return stored != tuple(getattr(instance, field) for field in fields)
+
+
+def _invalidate_post(post, group_ids=()):
+    """Сбрасывает страницы, на которых виден пост."""
+    group_ids = {post.group_id, *group_ids} - {None}
+    tagged_cache.invalidate_on_commit(
+        'feed:index',
+        f'post:{post.pk}',
+        f'profile:{post.author_id}',
+        *(f'group:{group_id}' for group_id in group_ids),
+    )
+
+
+@receiver(pre_save, sender=Post)
+def image_cleared(sender, instance, **kwargs):
+    if not instance.image:
+        instance.image_width = instance.image_height = None
+        instance.image_placeholder = ''
+
+
+@receiver(pre_save, sender=Post)
+def post_edited(sender, instance, raw=False, **kwargs):
+    if instance.pk is not None and not raw:
+        instance.card_version += 1
+        stored = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first()
+        )
+        if stored is not None:
+            instance._old_group_ids = (stored[0],)
+            instance._old_image = stored[1]
+
+
+@receiver(pre_save, sender=User)
+def author_renaming(sender, instance, raw=False, update_fields=None,
+                    **kwargs):
+    instance._cards_stale = not raw and _card_fields_changed(
+        instance, cards.author_card_fields, update_fields)
+
+
+@receiver(post_save, sender=User)
+def author_renamed(sender, instance, **kwargs):
+    if getattr(instance, '_cards_stale', False):
+        tagged_cache.invalidate_on_commit(f'author:{instance.pk}', 'authors')
+
+
+@receiver(pre_save, sender=Group)
+def group_changing(sender, instance, raw=False, update_fields=None,
+                   **kwargs):
+    instance._cards_stale = not raw and _card_fields_changed(
+        instance, cards.group_card_fields, update_fields)
+
+
+@receiver(post_save, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    tagged_cache.invalidate_on_commit('groups', f'group:{instance.pk}')
+    if getattr(instance, '_cards_stale', False):
+        Post.objects.filter(group_id=instance.pk).update(
+            card_version=F('card_version') + 1)
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # SET_NULL у Post.group выполняется одним UPDATE в обход сигналов Post,
+    # поэтому ключи карточек со ссылкой на группу меняются здесь.
+    Post.objects.filter(group_id=instance.pk).update(
+        card_version=F('card_version') + 1)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    tagged_cache.invalidate_on_commit('groups', f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.bump_user(instance.author_id, posts_count=1)
+        feed.fan_out_post(instance)
+    old_image = getattr(instance, '_old_image', '')
+    if old_image != instance.image.name:
+        blobs.release_on_commit(old_image)
+    _invalidate_post(instance, getattr(instance, '_old_group_ids', ()))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, create=False, posts_count=-1)
+    blobs.release_on_commit(instance.image.name)
+    _invalidate_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_comments(instance.post_id, 1)
+        tagged_cache.invalidate_on_commit(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+    tagged_cache.invalidate_on_commit(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.user_id, following_count=1)
+        counters.bump_user(instance.author_id, followers_count=1)
+        feed.add_author_to_feed(instance.user_id, instance.author_id)
+        tagged_cache.invalidate_on_commit(
+            f'profile:{instance.user_id}', f'profile:{instance.author_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.user_id, create=False, following_count=-1)
+    counters.bump_user(instance.author_id, create=False, followers_count=-1)
+    feed.remove_author_from_feed(instance.user_id, instance.author_id)
+    tagged_cache.invalidate_on_commit(
+        f'profile:{instance.user_id}', f'profile:{instance.author_id}')
+
+
+@receiver(post_migrate)
+def search_triggers_restored(sender, using, **kwargs):
+    # Пересоздание posts_post в миграциях SQLite удаляет триггеры индекса.
+    if sender.name == 'posts':
+        search.install_triggers(connections[using])
@@ -0,0 +1,54 @@
+from django import template
+
+from posts import resize, thumbnails
+
+register = template.Library()
+
+
+def _srcset(post, variants):
+    candidates = []
+    for preset, width in variants:
+        thumbnail = thumbnails.lookup(post, preset)
+        if thumbnail is not None:
+            candidates.append(f'{thumbnail.url} {width}w')
+    return ', '.join(candidates)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post, name):
+    """<picture> с вариантами картинки поста разной ширины и формата.
+
+    Пока варианты не нарезаны, показывается оригинал. Размеры берутся из
+    KV-хранилища миниатюр или из полей поста, файл не открывается.
+    """
+    if not post.image:
+        return {}
+    picture = thumbnails.pictures[name]
+    sources = []
+    for mime_type, variants in picture['sources']:
+        srcset = _srcset(post, variants)
+        if srcset:
+            sources.append({'type': mime_type, 'srcset': srcset})
+    image = thumbnails.lookup(post, name)
+    if image is not None:
+        width, height = image.size
+    else:
+        thumbnails.schedule(post)
+        image = post.image
+        width, height = post.image_width, post.image_height
+    return {
+        'src': image.url,
+        'srcset': _srcset(post, picture['img']),
+        'sources': sources,
+        'sizes': picture['sizes'],
+        'width': width,
+        'height': height,
+        'placeholder': post.image_placeholder,
+    }
+
+
+@register.simple_tag
+def resized(image, geometry):
+    """Подписанная ссылка на картинку в размере geometry, например
+    «480x170c»; режется при первом запросе."""
+    return resize.resized_url(image.name, geometry)
@@ -0,0 +1,174 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import isolated_caches
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@isolated_caches()
+class CommentApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='api_author')
+        cls.post = Post.objects.create(author=cls.author, text='text')
+        cls.url = reverse('posts:api_comments', args=[cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def test_create_comment(self):
+        """Ответ — новый комментарий и его HTML-фрагмент."""
+        response = self.authorized_client.post(self.url, {'text': 'Привет'})
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        comment = Comment.objects.get()
+        self.assertEqual(data['comment']['id'], comment.pk)
+        self.assertEqual(data['comment']['author'], 'api_author')
+        self.assertIn('Привет', data['html'])
+        self.assertTemplateUsed(response, 'posts/includes/comment.html')
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).comments_count, 1)
+
+    def test_create_comment_query_count(self):
+        # Сессия, пользователь, проверка поста, вставка комментария и
+        # сдвиг счётчика; остальное — точки сохранения транзакции.
+        self.authorized_client.get(self.url)
+        with self.assertNumQueries(7):
+            self.authorized_client.post(self.url, {'text': 'text'})
+
+    def test_create_errors(self):
+        self.assertEqual(
+            self.client.post(self.url, {'text': 'text'}).status_code, 403)
+        response = self.authorized_client.post(self.url, {'text': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+        missing = reverse('posts:api_comments', args=[self.post.id + 1])
+        self.assertEqual(
+            self.authorized_client.post(missing, {'text': 't'}).status_code,
+            404)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_list_comments(self):
+        """Список листается курсором от новых комментариев к старым."""
+        for i in range(25):
+            Comment.objects.create(
+                post=self.post, author=self.author, text=f'comment {i}')
+        data = self.client.get(self.url).json()
+        self.assertEqual(len(data['results']), 20)
+        self.assertEqual(data['results'][0]['text'], 'comment 24')
+        data = self.client.get(
+            self.url, {'cursor': data['next_cursor']}).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['results']],
+            [f'comment {i}' for i in range(4, -1, -1)])
+        self.assertIsNone(data['next_cursor'])
+
+
+@isolated_caches()
+class FeedApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='feed_author', first_name='Лев')
+        cls.reader = User.objects.create_user(username='feed_reader')
+        cls.group = Group.objects.create(
+            title='API', slug='api_slug', description='desc')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(12):
+            cls.post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'text {i}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds(self):
+        """Ленты отдают посты от новых к старым со встроенными автором и
+        группой и листаются курсором."""
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        urls = {
+            reverse('posts:api_index'): self.client,
+            reverse('posts:api_group_posts', args=[self.group.slug]):
+                self.client,
+            reverse('posts:api_profile', args=[self.author.username]):
+                self.client,
+            reverse('posts:api_follow_index'): reader_client,
+        }
+        for url, client in urls.items():
+            with self.subTest(url=url):
+                data = client.get(url).json()
+                first = data['results'][0]
+                self.assertEqual(len(data['results']), 10)
+                self.assertEqual(first['text'], 'text 11')
+                self.assertEqual(first['author'], {
+                    'id': self.author.pk, 'username': 'feed_author',
+                    'first_name': 'Лев', 'last_name': '',
+                })
+                self.assertEqual(first['group']['slug'], 'api_slug')
+                self.assertNotIn('comments_count', first)
+                data = client.get(url, {'cursor': data['next_cursor']}).json()
+                self.assertEqual(
+                    [post['text'] for post in data['results']],
+                    ['text 1', 'text 0'])
+
+    def test_sparse_fields(self):
+        """fields= ограничивает и ответ, и читаемые колонки."""
+        url = reverse('posts:api_index')
+        with self.assertNumQueries(1) as queries:
+            data = self.client.get(url, {'fields': 'id,text'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        self.assertNotIn('"image"', queries.captured_queries[0]['sql'])
+        # Авторы и группы страницы читаются по одному запросу.
+        with self.assertNumQueries(3):
+            self.client.get(url, {'fields': 'id,author,group'})
+        response = self.client.get(url, {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_sparse_fields_in_follow_feed(self):
+        """fields= ограничивает колонки и в ленте подписок."""
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        url = reverse('posts:api_follow_index')
+        # Сессия, пользователь, ETag, популярные авторы и сама лента.
+        with self.assertNumQueries(5) as queries:
+            data = reader_client.get(url, {'fields': 'id'}).json()
+        self.assertEqual(data['results'][0], {'id': self.post.pk})
+        feed_sql = queries.captured_queries[-1]['sql']
+        self.assertIn('posts_feedentry', feed_sql)
+        self.assertNotIn('"text"', feed_sql)
+        self.assertNotIn('auth_user', feed_sql)
+
+    def test_post_detail(self):
+        Comment.objects.create(post=self.post, author=self.reader, text='c')
+        url = reverse('posts:api_post_detail', args=[self.post.id])
+        data = self.client.get(url).json()
+        self.assertEqual(data['id'], self.post.pk)
+        self.assertEqual(data['comments_count'], 1)
+        self.assertIsNone(data['image'])
+        missing = reverse('posts:api_post_detail', args=[self.post.id + 1])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_errors(self):
+        self.assertEqual(
+            self.client.get(reverse('posts:api_follow_index')).status_code,
+            403)
+        self.assertEqual(self.client.get(
+            reverse('posts:api_group_posts', args=['none'])).status_code, 404)
+
+    def test_conditional_get(self):
+        url = reverse('posts:api_index')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=self.author, text='new')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,51 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.testing import isolated_caches
+from .. import benchmark, urls
+from ..models import Comment, Follow
+
+
+@isolated_caches()
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('seed_yatube', users=20, groups=2, posts=100,
+                     comments=50, follows_per_user=3, workers=0,
+                     stdout=StringIO())
+
+    def test_run(self):
+        """Каждый маршрут posts/urls.py замерен, а набор не изменился."""
+        counts = (Comment.objects.count(), Follow.objects.count())
+        results = benchmark.run(repeat=2)
+        self.assertEqual(
+            (Comment.objects.count(), Follow.objects.count()), counts)
+        self.assertEqual(
+            set(results),
+            {pattern.name for pattern in urls.urlpatterns})
+        post_detail = results['post_detail']
+        self.assertEqual(post_detail['status'], 200)
+        self.assertGreater(post_detail['bytes'], 0)
+        self.assertGreater(post_detail['queries'], 0)
+        self.assertLessEqual(post_detail['p50_ms'], post_detail['p99_ms'])
+        self.assertEqual(results['add_comment']['status'], 302)
+
+    def test_compare(self):
+        baseline = {'small': {
+            'index': {'p95_ms': 10.0, 'queries': 3},
+            'profile': {'p95_ms': 10.0, 'queries': 6},
+            'search': {'p95_ms': 1.0, 'queries': 4},
+        }}
+        results = {'small': {
+            'index': {'p95_ms': 30.0, 'queries': 3},
+            'profile': {'p95_ms': 10.5, 'queries': 7},
+            # Рост в три раза, но на 2 мс — шум.
+            'search': {'p95_ms': 3.0, 'queries': 4},
+        }}
+        regressions = benchmark.compare(results, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('small index: p95', regressions[0])
+        self.assertIn('small profile: запросов 6 -> 7', regressions[1])
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.testing import isolated_caches
+from .. import blobs
+from ..blobs import collect_garbage, references, storage
+from ..models import Post
+from .test_forms import small_gif
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+@isolated_caches()
+class BlobTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_post(self, name):
+        post = Post(author=self.user, text=name)
+        post.image.save(name, ContentFile(small_gif), save=False)
+        post.save()
+        return post
+
+    def stored_files(self):
+        return sorted(storage().blobs('posts/'))
+
+    def test_same_content_stored_once(self):
+        """Одинаковые загрузки под разными именами делят один файл."""
+        for name in ('meme.gif', 'meme-copy.gif'):
+            self.client.post(reverse('posts:post_create'), data={
+                'text': name,
+                'image': ContentFile(small_gif, name=name),
+            })
+        first, second = Post.objects.order_by('pk')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.stored_files(), [first.image.name])
+        self.assertEqual(references(first.image.name), 2)
+
+    def test_garbage_collected(self):
+        """Файл удаляется, только когда на него не осталось ссылок."""
+        first = self.create_post('a.gif')
+        second = self.create_post('b.gif')
+        name = first.image.name
+        first.delete()
+        self.assertEqual(collect_garbage(grace=0), [])
+        second.image = ''
+        second.save()
+        self.assertEqual(collect_garbage(grace=0), [name])
+        self.assertEqual(self.stored_files(), [])
+
+    def test_fresh_file_kept(self):
+        """Недавно загруженный файл не удаляется: ссылающийся на него пост
+        мог ещё не закоммититься."""
+        name = storage().save('posts/new.gif', ContentFile(small_gif))
+        self.assertEqual(collect_garbage(), [])
+        os.utime(storage().path(name), (0, 0))
+        self.assertEqual(collect_garbage(), [name])
+
+    def test_reupload_during_collection_keeps_file(self):
+        """Файл, заново загруженный между первой проверкой и удалением,
+        остаётся на месте."""
+        name = storage().save('posts/old.gif', ContentFile(small_gif))
+        os.utime(storage().path(name), (0, 0))
+        is_stale = blobs._is_stale
+        calls = []
+
+        def reupload_after_first_check(checked, grace):
+            stale = is_stale(checked, grace)
+            if not calls:
+                storage().save('posts/again.gif', ContentFile(small_gif))
+            calls.append(stale)
+            return stale
+
+        with mock.patch.object(blobs, '_is_stale',
+                               side_effect=reupload_after_first_check):
+            self.assertEqual(collect_garbage(), [])
+        self.assertEqual(calls, [True, False])
+        self.assertTrue(storage().exists(name))
+        storage().delete(name)
@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from core import tagged_cache
+from core.testing import isolated_caches
+from ..cards import card_key, render_cards
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+@isolated_caches()
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cards_author')
+        cls.group = Group.objects.create(
+            title='cards group',
+            slug='cards_slug',
+            description='test desc',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, group=self.group, text='card text')
+
+    def feed_post(self):
+        return Post.objects.for_feed().get(pk=self.post.pk)
+
+    def test_card_is_rendered_once_and_served_from_cache(self):
+        """Повторная страница берёт карточку из кэша."""
+        card, = render_cards([self.feed_post()])
+        self.assertIn('card text', card)
+        tagged_cache.put(card_key(self.post), 'cached card', ['test'])
+        self.assertEqual(render_cards([self.feed_post()]), ['cached card'])
+
+    def test_card_version_bumps(self):
+        """Правка поста и смена ярлыка группы меняют ключ карточки."""
+        keys = {card_key(self.feed_post())}
+        self.post.text = 'edited'
+        self.post.save()
+        keys.add(card_key(self.feed_post()))
+        self.group.slug = 'cards_slug_new'
+        self.group.save()
+        keys.add(card_key(self.feed_post()))
+        self.assertEqual(len(keys), 3)
+
+    def test_author_rename_invalidates_card(self):
+        """Переименование автора сбрасывает его карточки по тегу."""
+        render_cards([self.feed_post()])
+        self.user.save(update_fields=['last_login'])
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertIn('Renamed', render_cards([self.feed_post()])[0])
+
+    def test_group_delete_invalidates_card(self):
+        """Удаление группы убирает ссылку на неё из карточки."""
+        group = Group.objects.create(
+            title='doomed group', slug='doomed_slug', description='')
+        self.post.group = group
+        self.post.save()
+        card, = render_cards([self.feed_post()])
+        self.assertIn('doomed_slug', card)
+        group.delete()
+        card, = render_cards([self.feed_post()])
+        self.assertNotIn('doomed_slug', card)
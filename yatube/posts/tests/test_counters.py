@@ -0,0 +1,82 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from core.testing import isolated_caches
+from ..counters import get_counters
+from ..models import Comment, Follow, Post, UserCounters
+
+User = get_user_model()
+
+
+@isolated_caches()
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='counter_author')
+        cls.reader = User.objects.create_user(username='counter_reader')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(author=self.author, text='text')
+        Comment.objects.create(post=post, author=self.reader, text='c')
+        Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        author = UserCounters.objects.get(user=self.author)
+        self.assertEqual(
+            (author.posts_count, author.followers_count), (1, 1))
+        self.assertEqual(
+            UserCounters.objects.get(user=self.reader).following_count, 1)
+
+        Follow.objects.filter(user=self.reader).delete()
+        post.comments.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        Post.objects.all().delete()
+        author.refresh_from_db()
+        self.assertEqual(
+            (author.posts_count, author.followers_count), (0, 0))
+
+    def test_user_with_posts_and_follows_can_be_deleted(self):
+        """Удаление пользователя не создаёт заново его строку счётчиков."""
+        user = User.objects.create_user(username='counter_leaving')
+        post = Post.objects.create(author=user, text='text')
+        Comment.objects.create(post=post, author=self.reader, text='c')
+        Follow.objects.create(user=user, author=self.author)
+        Follow.objects.create(user=self.reader, author=user)
+        user_id = user.pk
+        user.delete()
+        connection.check_constraints()
+        self.assertFalse(UserCounters.objects.filter(user_id=user_id))
+        self.assertEqual(
+            UserCounters.objects.get(user=self.author).followers_count, 0)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.reader).following_count, 0)
+
+    def test_get_counters_without_row(self):
+        """У пользователя без строки счётчиков они нулевые."""
+        counters = get_counters(self.reader)
+        self.assertEqual(counters.posts_count, 0)
+
+    def test_reconcile_counters_fixes_drift(self):
+        """reconcile_counters исправляет расхождения."""
+        post = Post.objects.create(author=self.author, text='text')
+        Comment.objects.create(post=post, author=self.reader, text='c')
+        UserCounters.objects.update(posts_count=42)
+        Post.objects.update(comments_count=7)
+        UserCounters.objects.filter(user=self.reader).delete()
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)])
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        author = UserCounters.objects.get(user=self.author)
+        self.assertEqual(
+            (author.posts_count, author.followers_count), (1, 1))
+        reader = UserCounters.objects.get(user=self.reader)
+        self.assertEqual(reader.following_count, 1)
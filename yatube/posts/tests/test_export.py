@@ -0,0 +1,112 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.testing import isolated_caches
+from ..models import Comment, Group, Post
+from .test_forms import small_gif
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def ndjson_records(data):
+    return [json.loads(line) for line in data.decode().splitlines()]
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+@isolated_caches()
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='exporter')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Архив', slug='archive', description='')
+        for text in ('первый', 'второй'):
+            post = Post(author=cls.author, group=cls.group, text=text)
+            post.image.save('pic.gif', ContentFile(small_gif), save=False)
+            post.save()
+        cls.post = post
+        Post.objects.create(author=cls.other, text='чужой')
+        Comment.objects.create(post=post, author=cls.author, text='мой')
+        Comment.objects.create(post=post, author=cls.other, text='не мой')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def test_user_ndjson(self):
+        """Пользователь получает только свои посты и комментарии."""
+        response = self.authorized_client.get(reverse('posts:export'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('exporter.ndjson', response['Content-Disposition'])
+        records = ndjson_records(b''.join(response.streaming_content))
+        self.assertEqual(
+            [(record['type'], record['text']) for record in records],
+            [('post', 'первый'), ('post', 'второй'), ('comment', 'мой')])
+        self.assertEqual(records[0]['group'], 'archive')
+        self.assertEqual(records[2]['post'], self.post.pk)
+
+    def test_non_ascii_filename(self):
+        """Кириллический username не ломает заголовок Content-Disposition."""
+        self.authorized_client.force_login(
+            User.objects.create_user(username='Лана'))
+        response = self.authorized_client.get(reverse('posts:export'))
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="export.ndjson"; '
+            "filename*=UTF-8''%D0%9B%D0%B0%D0%BD%D0%B0.ndjson")
+
+    def test_zip_with_images(self):
+        """Общий файл картинки двух постов попадает в архив один раз."""
+        response = self.authorized_client.get(
+            reverse('posts:export'), {'format': 'zip', 'images': '1'})
+        archive = zipfile.ZipFile(
+            io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), [
+            'content.ndjson', f'images/{self.post.image.name}'])
+        self.assertEqual(
+            archive.read(f'images/{self.post.image.name}'), small_gif)
+        self.assertEqual(
+            len(ndjson_records(archive.read('content.ndjson'))), 3)
+
+    def test_group_export_for_staff(self):
+        url = reverse('posts:group_export', args=[self.group.slug])
+        self.assertEqual(self.authorized_client.get(url).status_code, 403)
+        User.objects.filter(pk=self.author.pk).update(is_staff=True)
+        response = self.authorized_client.get(url)
+        records = ndjson_records(b''.join(response.streaming_content))
+        self.assertEqual(
+            [record['text'] for record in records],
+            ['первый', 'второй', 'мой', 'не мой'])
+
+    def test_command_round_trip(self):
+        """Выгрузку команды можно загрузить обратно через load_content."""
+        path = os.path.join(TEMP_MEDIA_ROOT, 'export.ndjson')
+        call_command('export_content', '--user=exporter', output=path)
+        Post.objects.filter(author=self.author).delete()
+        call_command('load_content', path, skip_rebuild=True,
+                     stdout=io.StringIO())
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).text, 'второй')
+        self.assertEqual(
+            Comment.objects.filter(post_id=self.post.pk).count(), 1)
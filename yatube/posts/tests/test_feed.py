@@ -0,0 +1,135 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.testing import isolated_caches
+from .. import feed
+from ..models import FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+@isolated_caches()
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='feed_author')
+        cls.reader = User.objects.create_user(username='feed_reader')
+        cls.old_post = Post.objects.create(author=cls.author, text='old')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed_posts(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_new_posts_fan_out(self):
+        """Подписка достраивает ленту, новые посты раскладываются."""
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        self.assertEqual(self.feed_posts(), [self.old_post])
+        new_post = Post.objects.create(author=self.author, text='new')
+        self.assertEqual(self.feed_posts(), [new_post, self.old_post])
+
+    @override_settings(FEED_BACKFILL_POSTS=1)
+    def test_follow_backfills_only_recent_posts(self):
+        """При подписке в ленту попадают только последние посты автора."""
+        new_post = Post.objects.create(author=self.author, text='new')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            list(FeedEntry.objects.values_list('post_id', flat=True)),
+            [new_post.pk])
+
+    def test_unfollow_trims_feed(self):
+        """Отписка убирает посты автора из ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username]))
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed_posts(), [])
+
+    def test_rebuild_feeds_command(self):
+        """rebuild_feeds восстанавливает ленты по подпискам."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(self.feed_posts(), [self.old_post])
+
+    def test_rebuild_feeds_keeps_other_feeds(self):
+        """Пока пересобирается одна лента, остальные не пустеют, а ленты
+        без подписок очищаются."""
+        other = User.objects.create_user(username='feed_other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        stale = User.objects.create_user(username='feed_stale')
+        FeedEntry.objects.create(
+            user=stale, post=self.old_post, author=self.author,
+            pub_date=self.old_post.pub_date)
+        rebuild_feed = feed.rebuild_feed
+        sizes = []
+
+        def rebuild_and_count(user_id):
+            sizes.append(FeedEntry.objects.exclude(user_id=user_id).count())
+            rebuild_feed(user_id)
+
+        with mock.patch.object(feed, 'rebuild_feed',
+                               side_effect=rebuild_and_count):
+            call_command('rebuild_feeds', stdout=StringIO())
+        self.assertNotIn(0, sizes)
+        self.assertFalse(FeedEntry.objects.filter(user=stale).exists())
+        self.assertEqual(self.feed_posts(), [self.old_post])
+
+    @override_settings(FEED_FANOUT_THRESHOLD=2)
+    def test_celebrity_posts_are_pulled_and_merged(self):
+        """Посты популярного автора не раскладываются, но есть в ленте."""
+        celebrity = User.objects.create_user(username='feed_celebrity')
+        fan = User.objects.create_user(username='feed_fan')
+        Follow.objects.create(user=fan, author=celebrity)
+        Follow.objects.create(user=self.reader, author=celebrity)
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = []
+        for i in range(12):
+            posts.append(Post.objects.create(
+                author=celebrity if i % 2 else self.author, text=str(i)))
+        self.assertFalse(
+            FeedEntry.objects.filter(author=celebrity).exists())
+        expected = [self.old_post] + posts
+        expected.reverse()
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        page = response.context['page_obj']
+        self.assertEqual(list(page), expected[:10])
+        response = self.reader_client.get(
+            reverse('posts:follow_index'), {'cursor': page.next_cursor})
+        self.assertEqual(list(response.context['page_obj']), expected[10:])
+
+    @override_settings(FEED_FANOUT_THRESHOLD=3,
+                       FEED_FANOUT_DEMOTE_THRESHOLD=2)
+    def test_celebrity_is_demoted_by_rebuild_feeds(self):
+        """Популярный автор остаётся им при отписках, пока rebuild_feeds
+        не увидит, что подписчиков меньше нижнего порога, и не разложит
+        его посты по лентам оставшихся подписчиков."""
+        others = [User.objects.create_user(username=f'feed_other{i}')
+                  for i in range(2)]
+        for user in [self.reader, *others]:
+            Follow.objects.create(user=user, author=self.author)
+        pulled_post = Post.objects.create(author=self.author, text='pulled')
+        for user in others:
+            Follow.objects.filter(user=user).delete()
+            self.assertTrue(feed.is_celebrity(self.author.pk))
+            self.assertFalse(
+                FeedEntry.objects.filter(post=pulled_post).exists())
+            self.assertEqual(self.feed_posts(), [pulled_post, self.old_post])
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertFalse(feed.is_celebrity(self.author.pk))
+        self.assertEqual(
+            set(FeedEntry.objects.values_list('user_id', 'post_id')),
+            {(self.reader.pk, pulled_post.pk),
+             (self.reader.pk, self.old_post.pk)})
+        self.assertEqual(self.feed_posts(), [pulled_post, self.old_post])
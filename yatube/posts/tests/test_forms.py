@@ -3,6 +3,7 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from core.testing import isolated_caches
 from ..forms import PostForm
 from http import HTTPStatus
 import shutil
@@ -26,6 +27,7 @@ small_gif = (
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@isolated_caches()
 class PostFormsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -86,11 +88,13 @@ class PostFormsTests(TestCase):
         last_post = Post.objects.latest('pub_date')
         self.assertEqual(last_post.text, form_data['text'])
         self.assertEqual(last_post.group, self.group)
-        self.assertEqual(last_post.image, f"posts/{form_data['image']}")
+        # Картинка сохраняется под хэшем содержимого.
+        self.assertRegex(
+            last_post.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
         self.assertTrue(
             Post.objects.filter(
                 text=form_data['text'],
-                image='posts/small.gif'
+                image=last_post.image.name
             ).exists()
         )
 
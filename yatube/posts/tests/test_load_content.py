@@ -0,0 +1,145 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core.testing import isolated_caches
+from ..management.commands import load_content
+from ..models import Comment, FeedEntry, Follow, Group, Post
+
+User = get_user_model()
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+records = [
+    {'type': 'post', 'id': 101, 'author': 'writer', 'group': 'legacy',
+     'text': 'Старый пост', 'pub_date': '2015-03-01T10:00:00'},
+    {'type': 'post', 'id': 102, 'author': 'writer', 'text': 'Ещё один'},
+    {'type': 'comment', 'id': 501, 'post': 101, 'author': 'reader',
+     'text': 'Комментарий'},
+    {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+    {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+    {'type': 'post', 'id': 103, 'author': 'nobody', 'text': 'Без автора'},
+    {'type': 'comment', 'id': 502, 'post': 999, 'text': 'Без поста'},
+]
+
+
+@isolated_caches()
+class LoadContentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.writer = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        Group.objects.create(title='Legacy', slug='legacy', description='')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def write_jsonl(self, rows):
+        path = os.path.join(TEMP_DIR, 'content.jsonl')
+        with open(path, 'w') as dump:
+            dump.writelines(json.dumps(row) + '\n' for row in rows)
+        return path
+
+    def load(self, path, **options):
+        out = StringIO()
+        call_command('load_content', path, batch_size=2, stdout=out,
+                     stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_load(self):
+        """Загрузка сохраняет id и даты, пропускает битые записи и
+        пересчитывает счётчики и ленты."""
+        output = self.load(self.write_jsonl(records))
+        self.assertIn('в секунду', output)
+        self.assertIn('пропущено: 2', output)
+        post = Post.objects.get(pk=101)
+        self.assertEqual(post.group.slug, 'legacy')
+        self.assertEqual(
+            post.pub_date, timezone.make_aware(datetime(2015, 3, 1, 10)))
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.get().pk, 501)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.writer.counters.posts_count, 2)
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(), 2)
+
+    def test_resume_from_checkpoint(self):
+        """После сбоя загрузка продолжается с записи из checkpoint, а
+        повтор уже закоммиченной пачки ничего не дублирует."""
+        checkpoint = os.path.join(TEMP_DIR, 'checkpoint.json')
+        with open(checkpoint, 'w') as state:
+            json.dump({'records': 1}, state)
+        Post.objects.create(pk=102, author=self.writer, text='Ещё один')
+        self.load(self.write_jsonl(records), checkpoint=checkpoint)
+        self.assertFalse(Post.objects.filter(pk=101).exists())
+        self.assertEqual(Post.objects.filter(pk=102).count(), 1)
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_taken_ids_are_skipped(self):
+        """Пост с занятым id не загружается, и его комментарии не
+        цепляются к чужому посту; комментарии без автора пропускаются."""
+        Post.objects.create(pk=1, author=self.reader, text='Свой пост')
+        output = self.load(self.write_jsonl([
+            {'type': 'post', 'id': 1, 'author': 'writer', 'text': 'Чужой'},
+            {'type': 'comment', 'id': 601, 'post': 1, 'author': 'reader',
+             'text': 'К чужому'},
+            {'type': 'post', 'id': 2, 'author': 'writer', 'text': 'Новый'},
+            {'type': 'comment', 'id': 602, 'post': 2, 'author': 'ghost',
+             'text': 'Без автора'},
+        ]), skip_rebuild=True)
+        self.assertIn('пропущено: 3', output)
+        self.assertEqual(Post.objects.get(pk=1).text, 'Свой пост')
+        self.assertTrue(Post.objects.filter(pk=2).exists())
+        self.assertFalse(Comment.objects.exists())
+
+    def test_conflicts_survive_resume(self):
+        """Комментарий к посту с занятым id не цепляется к чужому посту,
+        даже если загрузка продолжена после сбоя между ними."""
+        Post.objects.create(pk=1, author=self.reader, text='Свой пост')
+        rows = [
+            {'type': 'post', 'id': 1, 'author': 'writer', 'text': 'Чужой'},
+            {'type': 'post', 'id': 2, 'author': 'writer', 'text': 'Новый'},
+            {'type': 'comment', 'id': 601, 'post': 1, 'author': 'reader',
+             'text': 'К чужому'},
+        ]
+        path = self.write_jsonl(rows)
+        checkpoint = os.path.join(TEMP_DIR, 'checkpoint.json')
+        load_batch = load_content.Command.load_batch
+
+        def crash_after_first(command, batch):
+            if os.path.exists(checkpoint):
+                raise RuntimeError('сбой')
+            load_batch(command, batch)
+
+        with mock.patch.object(load_content.Command, 'load_batch',
+                               crash_after_first):
+            with self.assertRaises(RuntimeError):
+                self.load(path, checkpoint=checkpoint, skip_rebuild=True)
+        self.load(path, checkpoint=checkpoint, skip_rebuild=True)
+        self.assertTrue(Post.objects.filter(pk=2).exists())
+        self.assertFalse(Comment.objects.exists())
+
+    def test_csv(self):
+        path = os.path.join(TEMP_DIR, 'content.csv')
+        with open(path, 'w') as dump:
+            dump.write('type,id,author,group,text,pub_date,post,user\n'
+                       'post,7,writer,,Из CSV,,,\n'
+                       'follow,,writer,,,,,reader\n')
+        self.load(path, skip_rebuild=True)
+        self.assertEqual(Post.objects.get(pk=7).text, 'Из CSV')
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.writer)
+            .exists())
@@ -1,11 +1,13 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
+from core.testing import isolated_caches
 from ..models import Post, Group, Comment
 
 User = get_user_model()
 
 
+@isolated_caches()
 class PostModelTest(TestCase):
     @classmethod
     def setUpClass(cls):
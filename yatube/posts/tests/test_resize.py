@@ -0,0 +1,96 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from core.testing import isolated_caches
+from ..resize import cache_dir, resized_url
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_CACHE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   RESIZE_CACHE_DIR=TEMP_CACHE_DIR)
+@isolated_caches()
+class ResizeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        for name in ('a.jpg', 'copy.jpg'):
+            Image.new('RGB', (400, 200), (10, 120, 200)).save(
+                os.path.join(TEMP_MEDIA_ROOT, 'posts', name), 'JPEG')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def cached_files(self):
+        return [
+            os.path.join(root, name)
+            for root, _, files in os.walk(cache_dir()) for name in files
+        ]
+
+    def test_signature(self):
+        """Ссылку с чужой подписью или геометрией не отдают."""
+        url = resized_url('posts/a.jpg', '100x100')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        forged = url.replace('100x100', '2000x2000')
+        self.assertEqual(self.client.get(forged).status_code, 404)
+        self.assertEqual(len(self.cached_files()), 1)
+
+    def test_resize_cached(self):
+        """Первый запрос режет картинку, повторный берёт её с диска;
+        одинаковые оригиналы делят одну запись."""
+        response = self.client.get(resized_url('posts/a.jpg', '100x100'))
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('max-age', response['Cache-Control'])
+        image = Image.open(
+            io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (100, 50))
+        files = self.cached_files()
+        self.assertEqual(len(files), 1)
+        os.utime(files[0], (0, 0))
+        self.client.get(resized_url('posts/copy.jpg', '100x100'))
+        self.assertEqual(self.cached_files(), files)
+        self.assertGreater(os.stat(files[0]).st_mtime, 0)
+
+    def test_crop(self):
+        self.client.get(resized_url('posts/a.jpg', '50x50c'))
+        with Image.open(self.cached_files()[0]) as image:
+            self.assertEqual(image.size, (50, 50))
+
+    @override_settings(RESIZE_SENDFILE_HEADER='X-Accel-Redirect')
+    def test_sendfile(self):
+        response = self.client.get(resized_url('posts/a.jpg', '100x100'))
+        relative = os.path.relpath(self.cached_files()[0], cache_dir())
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/internal/resized/' + relative)
+        self.assertEqual(response.content, b'')
+
+    def test_missing_image(self):
+        response = self.client.get(resized_url('posts/none.jpg', '100x100'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_evict(self):
+        """Вытесняются давно не запрошенные картинки."""
+        self.client.get(resized_url('posts/a.jpg', '100x100'))
+        self.client.get(resized_url('posts/a.jpg', '60x60'))
+        old, new = sorted(self.cached_files(), key=os.path.getsize)
+        os.utime(old, (0, 0))
+        call_command('evict_resized_images',
+                     max_bytes=os.path.getsize(new), stdout=io.StringIO())
+        self.assertEqual(self.cached_files(), [new])
@@ -0,0 +1,83 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import isolated_caches
+from .. import search
+from ..models import Post
+
+User = get_user_model()
+
+
+@isolated_caches()
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='search_author')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Котики <b>спят</b> на солнце')
+        Post.objects.create(author=cls.author, text='Собаки гуляют')
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query):
+        paginator = search.SearchPaginator(query)
+        return [post.pk for post in paginator.get_cursor_page(None)]
+
+    def test_search_page(self):
+        """Поиск находит пост по началу слова и подсвечивает его."""
+        response = self.client.get(reverse('posts:search'), {'q': 'котик'})
+        page = response.context['page_obj']
+        self.assertEqual([post.pk for post in page], [self.post.pk])
+        self.assertContains(response, '<mark>Котики</mark>')
+        self.assertContains(response, '&lt;b&gt;')
+
+    def test_index_follows_writes(self):
+        Post.objects.bulk_create([Post(author=self.author, text='ёжик')])
+        self.assertEqual(len(self.found('ёжик')), 1)
+        Post.objects.filter(pk=self.post.pk).update(text='Коты')
+        self.assertEqual(self.found('котики'), [])
+        self.assertEqual(self.found('коты'), [self.post.pk])
+        Post.objects.filter(pk=self.post.pk).delete()
+        self.assertEqual(self.found('коты'), [])
+
+    def test_query_syntax_is_escaped(self):
+        for query in ('"', 'AND', 'NEAR(', '*', ''):
+            with self.subTest(query=query):
+                self.assertEqual(self.found(query), [])
+
+    def test_cursor_pagination(self):
+        Post.objects.bulk_create([
+            Post(author=self.author, text=f'лето {i}') for i in range(25)
+        ])
+        paginator = search.SearchPaginator('лето')
+        page = paginator.get_cursor_page(None)
+        seen = [post.pk for post in page]
+        while page.has_next():
+            page = paginator.get_cursor_page(page.next_cursor)
+            seen.extend(post.pk for post in page)
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        previous = paginator.get_cursor_page(page.previous_cursor)
+        self.assertEqual(len(previous), 10)
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.table}')
+        self.assertEqual(self.found('собаки'), [])
+        call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+        self.assertEqual(len(self.found('собаки')), 1)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            'search_admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собак'})
+        self.assertEqual(response.context['cl'].result_count, 1)
@@ -0,0 +1,73 @@
+import shutil
+import tempfile
+from collections import Counter
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F, Sum
+from django.test import TestCase, override_settings
+
+from core.testing import isolated_caches
+from ..models import Comment, Follow, Group, Post, UserCounters
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@isolated_caches()
+class SeedTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, **options):
+        defaults = {'users': 50, 'groups': 3, 'posts': 600, 'comments': 300,
+                    'follows_per_user': 5, 'workers': 0, 'seed': 7}
+        defaults.update(options)
+        call_command('seed_yatube', stdout=StringIO(), **defaults)
+
+    def snapshot(self):
+        return list(
+            Post.objects.order_by('pk')
+            .values_list('author__username', 'group__slug', 'text'))
+
+    def test_seed(self):
+        self.seed(images=2)
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        self.assertEqual(
+            Post.objects.exclude(image='').values('image').distinct().count(),
+            2)
+        # Счётчики пересчитаны после bulk_create.
+        self.assertEqual(
+            UserCounters.objects.aggregate(total=Sum('posts_count'))['total'],
+            600)
+        self.assertEqual(
+            Post.objects.aggregate(total=Sum('comments_count'))['total'], 300)
+
+    def test_power_law(self):
+        """Немногие авторы пишут большую часть постов."""
+        self.seed()
+        counts = sorted(
+            Counter(Post.objects.values_list('author_id', flat=True))
+            .values(), reverse=True)
+        self.assertGreater(counts[0], 10 * counts[len(counts) // 2])
+
+    def test_reproducible(self):
+        """Тот же seed даёт те же данные."""
+        self.seed(skip_rebuild=True)
+        first = self.snapshot()
+        Post.objects.all().delete()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed(skip_rebuild=True)
+        self.assertEqual(self.snapshot(), first)
+        self.seed(skip_rebuild=True, seed=8, users=0)
+        self.assertEqual(Post.objects.count(), 600)
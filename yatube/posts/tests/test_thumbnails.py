@@ -0,0 +1,142 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.testing import isolated_caches
+from .. import thumbnails
+from ..models import Post
+from .test_forms import small_gif
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+@isolated_caches()
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='thumb_author')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='text',
+            image=SimpleUploadedFile(
+                name='thumb.gif', content=small_gif, content_type='image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_original_until_generated(self):
+        """До нарезки страница показывает оригинал, после — миниатюру."""
+        url = reverse('posts:post_detail', args=[self.post.id])
+        response = self.client.get(url)
+        self.assertContains(response, self.post.image.url)
+
+        thumbnails.generate(self.post.pk, self.post.image.name)
+        thumbnail = thumbnails.cached_thumbnail(self.post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual(tuple(thumbnail.size), (960, 339))
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertGreater(post.card_version, self.post.card_version)
+        response = self.client.get(url)
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, self.post.image.url + '"')
+
+    def test_ready_thumbnails_are_not_rescheduled(self):
+        thumbnails.schedule(self.post)
+        job_key = thumbnails.JOB_PREFIX + self.post.image.name
+        self.assertIsNotNone(cache.get(job_key))
+        thumbnails.generate(self.post.pk, self.post.image.name)
+        self.assertIsNone(cache.get(job_key))
+        thumbnails.schedule(self.post)
+        self.assertIsNone(cache.get(job_key))
+
+    def test_schedule_uses_primed_thumbnails(self):
+        """Подготовленная страница не ищет миниатюры заново при постановке
+        нарезки."""
+        post = Post.objects.get(pk=self.post.pk)
+        thumbnails.prime_thumbnails([post])
+        with mock.patch.object(thumbnails, 'cached_thumbnail') as lookup:
+            thumbnails.schedule(post)
+        lookup.assert_not_called()
+        self.assertIsNotNone(
+            cache.get(thumbnails.JOB_PREFIX + post.image.name))
+
+    def test_prime_thumbnails_in_one_lookup(self):
+        """Миниатюры страницы ищутся одним запросом к KV-хранилищу."""
+        thumbnails.generate(self.post.pk, self.post.image.name)
+        posts = [Post.objects.get(pk=self.post.pk) for _ in range(3)]
+        posts.append(Post.objects.create(author=self.author, text='no image'))
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.prime_thumbnails(posts)
+        with self.assertNumQueries(0):
+            thumbnails.prime_thumbnails(posts)
+        expected = thumbnails.cached_thumbnail(self.post.image, 'card')
+        for post in posts[:3]:
+            self.assertEqual(post.primed_thumbnails['card'].url, expected.url)
+        self.assertEqual(posts[3].primed_thumbnails, {})
+
+    def test_feed_picture_variants(self):
+        """Лента отдаёт <picture> с WebP и srcset по ширинам."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertNotContains(response, 'image/webp')
+        self.assertContains(response, self.post.image.url)
+
+        thumbnails.generate(self.post.pk, self.post.image.name)
+        response = self.client.get(url)
+        webp = thumbnails.cached_thumbnail(self.post.image, 'card_480_webp')
+        self.assertTrue(webp.name.endswith('.webp'))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, f'{webp.url} 480w')
+
+    def test_backfill_command(self):
+        call_command('generate_image_variants', workers=0, stdout=StringIO())
+        for preset in thumbnails.presets:
+            with self.subTest(preset=preset):
+                self.assertIsNotNone(
+                    thumbnails.cached_thumbnail(self.post.image, preset))
+
+    def test_picture_is_sized_without_file_access(self):
+        """Размеры и заглушка картинки пишутся в пост при загрузке."""
+        self.client.force_login(self.author)
+        upload = SimpleUploadedFile(
+            name='sized.gif', content=small_gif, content_type='image/gif')
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'sized', 'image': upload})
+        post = Post.objects.get(text='sized')
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertRegex(post.image_placeholder, r'^#[0-9a-f]{6}$')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'width="2" height="1"')
+        self.assertContains(response, post.image_placeholder)
+
+    def test_backfill_dimensions_command(self):
+        Post.objects.filter(pk=self.post.pk).update(image_width=None)
+        Post.objects.create(
+            author=self.author, text='lost', image='posts/missing.gif')
+        out = StringIO()
+        call_command('backfill_image_dimensions', stdout=out)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertGreater(post.card_version, self.post.card_version)
+        self.assertIn('без файла картинки: 1', out.getvalue())
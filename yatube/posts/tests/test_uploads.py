@@ -0,0 +1,81 @@
+import shutil
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from core.testing import isolated_caches
+from ..forms import PostForm
+from ..uploads import normalize_image
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_jpeg(size, orientation=None):
+    image = Image.new('RGB', size, (200, 30, 30))
+    exif = Image.Exif()
+    exif[0x010f] = 'Phone'
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=100, exif=exif.tobytes())
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(POST_IMAGE_MAX_EDGE=100)
+@isolated_caches()
+class UploadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def test_normalize_image(self):
+        """Картинка повёрнута по EXIF, уменьшена и без метаданных."""
+        upload = make_jpeg((400, 200), orientation=6)
+        image, report = normalize_image(upload)
+        result = Image.open(image)
+        self.assertEqual(result.size, (50, 100))
+        self.assertEqual(result.format, 'JPEG')
+        self.assertNotIn('exif', result.info)
+        self.assertEqual(report.size, (50, 100))
+        self.assertGreater(report.bytes_saved, 0)
+        self.assertEqual(image.name, 'photo.jpg')
+
+    def test_smaller_original_is_kept(self):
+        """Если пережатие без уменьшения и метаданных даёт файл больше,
+        остаётся оригинал."""
+        buffer = BytesIO()
+        Image.effect_noise((60, 60), 64).convert('RGB').save(
+            buffer, 'JPEG', quality=20)
+        original = buffer.getvalue()
+        image, report = normalize_image(
+            SimpleUploadedFile('small.jpg', original, 'image/jpeg'))
+        self.assertEqual(image.read(), original)
+        self.assertEqual(report.bytes_saved, 0)
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_size_limit(self):
+        form = PostForm(data={'text': 'text'},
+                        files={'image': make_jpeg((20, 20))})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_pixel_limit(self):
+        with self.assertRaises(ValidationError):
+            normalize_image(make_jpeg((20, 20)))
+
+    @override_settings(POST_IMAGE_ORIGINALS_DIR=TEMP_DIR)
+    def test_original_kept(self):
+        upload = make_jpeg((400, 200))
+        original = upload.read()
+        normalize_image(upload)
+        kept = list(Path(TEMP_DIR).rglob('*.jpg'))
+        self.assertEqual(len(kept), 1)
+        self.assertEqual(kept[0].read_bytes(), original)
@@ -4,11 +4,13 @@ from http import HTTPStatus
 from django.urls import reverse
 from django.core.cache import cache
 
+from core.testing import isolated_caches
 from ..models import Post, Group
 
 User = get_user_model()
 
 
+@isolated_caches()
 class PostsURLTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -1,16 +1,22 @@
 from django.contrib.auth import get_user_model
 from django import forms
-from django.test import Client, TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.test import Client, RequestFactory, TestCase
 from django.urls import reverse
 from django.core.cache import cache
+from unittest import mock
 
 
-from ..models import Group, Post, Follow
+from core import tagged_cache
+from core.testing import isolated_caches
+from .. import views
+from ..models import Comment, Follow, Group, Post
 
 
 User = get_user_model()
 
 
+@isolated_caches()
 class PostPagesTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -159,23 +165,23 @@ class PostPagesTests(TestCase):
         self.assertEqual(len(response.context["page_obj"]), 0)
 
     def test_cache_on_index_page_works_correct(self):
-        """Кэширование данных на главной странице работает корректно."""
+        """Главная берётся из кэша и сбрасывается при изменении постов."""
+        cache.clear()
         response = self.client.get(reverse('posts:index'))
         cached_content = response.content
-        Post.objects.all().delete()
-        response = self.client.get(reverse('posts:index'))
-        cached_content_after_delete = response.content
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('posts:index'))
         self.assertEqual(
             cached_content,
-            cached_content_after_delete,
+            response.content,
             'Кэширование работает некорректно.'
         )
-        cache.clear()
+        Post.objects.all().delete()
         response = self.client.get(reverse('posts:index'))
         self.assertNotEqual(
             cached_content,
             response.content,
-            'Кэширование после очистки работает некорректно'
+            'Кэш не сбрасывается после удаления постов'
         )
 
     def test_follow(self):
@@ -208,3 +214,226 @@ class PostPagesTests(TestCase):
         not_follower_client.force_login(not_follower)
         response = not_follower_client.get(reverse('posts:follow_index'))
         self.assertEqual(len(response.context['page_obj']), 0)
+
+
+@isolated_caches()
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cursor_test')
+        Post.objects.bulk_create(
+            Post(text='text' + str(i), author=cls.user) for i in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_cursor_walks_feed_forward_and_back(self):
+        """Курсоры next/previous обходят ленту без пропусков."""
+        url = reverse('posts:profile', args=[self.user.username])
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        page = self.guest_client.get(url).context['page_obj']
+        seen = list(page)
+        pages = [page]
+        while page.has_next():
+            page = self.guest_client.get(
+                url, {'cursor': page.next_cursor}).context['page_obj']
+            seen.extend(page)
+            pages.append(page)
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(p) for p in pages], [10, 10, 5])
+        back = self.guest_client.get(
+            url, {'cursor': page.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back), list(pages[1]))
+        self.assertTrue(back.has_next())
+        self.assertTrue(back.has_previous())
+
+    def test_legacy_page_number_and_broken_cursor(self):
+        """Старые ссылки ?page=N и битый курсор не ломают ленту."""
+        url = reverse('posts:profile', args=[self.user.username])
+        page = self.guest_client.get(url, {'page': 3}).context['page_obj']
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.has_next())
+        page = self.guest_client.get(url, {'page': 5}).context['page_obj']
+        self.assertEqual(len(page), 5)
+        self.assertEqual(
+            self.guest_client.get(url, {'page': 99}).status_code, 404)
+        page = self.guest_client.get(
+            url, {'cursor': 'not-a-cursor'}).context['page_obj']
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page), 10)
+
+
+@isolated_caches()
+class QueryCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='queries_author')
+        cls.reader = User.objects.create_user(username='queries_reader')
+        cls.group = Group.objects.create(
+            title='queries group',
+            slug='queries_slug',
+            description='test desc',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(12):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text='text' + str(i))
+            Comment.objects.create(post=post, author=cls.reader, text='c')
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_views_query_count(self):
+        """Число запросов страницы не зависит от числа постов на ней."""
+        # Два запроса из них — сессия и пользователь; группа, профиль и
+        # пост делают ещё по одному запросу для ETag (группа — пока её id
+        # не закэширован).
+        pages = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list', args=[self.group.slug]): 5,
+            reverse('posts:profile', args=[self.author.username]): 6,
+            reverse('posts:post_detail', args=[self.post.id]): 5,
+            reverse('posts:follow_index'): 4,
+        }
+        for url, queries in pages.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    self.authorized_client.get(url)
+
+
+@isolated_caches()
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='comments_author')
+        cls.post = Post.objects.create(author=cls.author, text='text')
+        for i in range(25):
+            commenter = User.objects.create_user(username=f'commenter{i}')
+            Comment.objects.create(
+                post=cls.post, author=commenter, text=f'comment {i}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comments_paginated(self):
+        """Пост показывает первую порцию комментариев, «Показать ещё»
+        отдаёт остальные фрагментом."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.id]))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        self.assertEqual(comments[0].text, 'comment 24')
+        self.assertTrue(comments.has_next)
+        fragment = self.client.get(
+            reverse('posts:post_comments', args=[self.post.id]),
+            {'cursor': comments.next_cursor})
+        self.assertTemplateUsed(fragment, 'posts/includes/comment_list.html')
+        self.assertEqual(
+            [comment.text for comment in fragment.context['comments']],
+            [f'comment {i}' for i in range(4, -1, -1)])
+        self.assertNotContains(fragment, 'data-fragment')
+
+    def test_comment_authors_prefetched(self):
+        """Авторы комментариев читаются тем же запросом."""
+        url = reverse('posts:post_comments', args=[self.post.id])
+        # ETag, пост и порция комментариев.
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+
+@isolated_caches()
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='etag_author')
+        cls.group = Group.objects.create(
+            title='etag group',
+            slug='etag_slug',
+            description='test desc',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='etag text')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.id]),
+        )
+
+    def test_not_modified_without_rendering(self):
+        """Неизменившаяся страница отдаёт 304 без запросов к постам."""
+        for url in self.urls[:2]:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_content(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        Comment.objects.create(
+            post=self.post, author=self.author, text='new comment')
+        self.post.text = 'edited'
+        self.post.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_stale_copy_has_no_etag(self):
+        """Устаревшая копия, отданная во время чужой пересборки, не
+        получает ETag текущих версий и не даёт 304 после неё."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.create(author=self.author, text='newer')
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        lock_key = (tagged_cache.LOCK_PREFIX
+                    + tagged_cache.page_key(request, 'index_page'))
+        cache.add(lock_key, 1)
+        stale = self.client.get(url)
+        self.assertNotContains(stale, 'newer')
+        self.assertFalse(stale.has_header('ETag'))
+        self.assertIn('no-cache', stale['Cache-Control'])
+        cache.delete(lock_key)
+        fresh = self.client.get(url)
+        self.assertContains(fresh, 'newer')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=fresh['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_profile_invalidated_during_render_is_rebuilt(self):
+        """Инвалидация профиля во время рендера не оставляет в кэше
+        устаревшую страницу."""
+        get_counters = views.get_counters
+
+        def counters_then_invalidate(user):
+            tagged_cache.invalidate(f'profile:{user.pk}')
+            return get_counters(user)
+
+        url = reverse('posts:profile', args=[self.author.username])
+        with mock.patch.object(views, 'get_counters',
+                               side_effect=counters_then_invalidate) as calls:
+            self.client.get(url)
+            self.client.get(url)
+        self.assertEqual(calls.call_count, 2)
+
+    def test_author_rename_changes_etag(self):
+        url = reverse('posts:post_detail', args=[self.post.id])
+        etag = self.client.get(url)['ETag']
+        self.author.first_name = 'Renamed'
+        self.author.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
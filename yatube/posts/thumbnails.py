@@ -0,0 +1,205 @@
+"""Фоновая нарезка миниатюр картинок постов.
+
+После сохранения поста с картинкой все миниатюры из presets режутся в
+пуле процессов, а до их готовности шаблоны показывают оригинал. Когда
+миниатюры готовы, у поста меняется card_version, и кэш карточек и
+страниц с ним сбрасывается.
+
+Кроме миниатюры карточки режутся её варианты разной ширины и в WebP для
+<picture> (см. pictures); старые картинки дорезает команда
+generate_image_variants.
+
+THUMBNAIL_WORKERS задаёт размер пула; при 0 миниатюры режутся в том же
+процессе сразу после коммита.
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore,
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_card_options = {'crop': 'center', 'upscale': True}
+# Геометрии миниатюр, которые используют шаблоны.
+presets = {
+    'card': ('960x339', _card_options),
+    'card_480': ('480x170', _card_options),
+    'card_480_webp': ('480x170', dict(_card_options, format='WEBP')),
+    'card_960_webp': ('960x339', dict(_card_options, format='WEBP')),
+}
+# Наборы вариантов для <picture>: источники по MIME-типу в порядке
+# предпочтения и srcset самого <img>, в каждом — (пресет, ширина).
+# AVIF не режем: sorl не знает для него расширения файла.
+pictures = {
+    'card': {
+        'sources': (
+            ('image/webp', (('card_480_webp', 480), ('card_960_webp', 960))),
+        ),
+        'img': (('card_480', 480), ('card', 960)),
+        'sizes': '(min-width: 992px) 960px, 100vw',
+    },
+}
+# Сколько секунд не ставить повторно задачу для той же картинки.
+job_timeout: int = 10 * 60
+JOB_PREFIX = 'thumbnail_job:'
+
+_executor = None
+
+
+def workers():
+    return getattr(settings, 'THUMBNAIL_WORKERS', 2)
+
+
+def _thumbnail_options(source, options):
+    # Те же умолчания, что добавляет ThumbnailBackend.get_thumbnail, иначе
+    # имя миниатюры не совпадёт с нарезанной.
+    options = dict(options)
+    backend = default.backend
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def _thumbnail_file(file_, preset):
+    geometry, options = presets[preset]
+    source = ImageFile(file_)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, _thumbnail_options(source, options))
+    return ImageFile(name, default.storage)
+
+
+def cached_thumbnail(file_, preset):
+    """Готовая миниатюра из KV-хранилища sorl или None, не нарезая её."""
+    return default.kvstore.get(_thumbnail_file(file_, preset))
+
+
+def _kvstore_get_many(keys):
+    """Сырые значения KV-хранилища sorl: один get_many к кэшу и один
+    запрос к БД за промахами, которые затем кладутся в кэш."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        values = {key: kvstore._get_raw(key) for key in keys}
+        return {key: value for key, value in values.items() if value}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        stored = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        kvstore.cache.set_many(
+            {key: stored.get(key, EMPTY_VALUE) for key in missing},
+            thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+        values.update(stored)
+    return {
+        key: value for key, value in values.items() if value != EMPTY_VALUE
+    }
+
+
+def prime_thumbnails(posts):
+    """Находит миниатюры всех картинок постов разом.
+
+    Результат кладётся в post.primed_thumbnails ({пресет: миниатюра или
+    None}), откуда его берут lookup и schedule.
+    """
+    wanted = {}
+    for post in posts:
+        post.primed_thumbnails = {}
+        if not post.image:
+            continue
+        for preset in presets:
+            post.primed_thumbnails[preset] = None
+            key = add_prefix(_thumbnail_file(post.image, preset).key)
+            wanted.setdefault(key, []).append((post, preset))
+    if not wanted:
+        return
+    for key, value in _kvstore_get_many(list(wanted)).items():
+        thumbnail = deserialize_image_file(value)
+        for post, preset in wanted[key]:
+            post.primed_thumbnails[preset] = thumbnail
+
+
+def lookup(post, preset):
+    """Миниатюра поста: из prime_thumbnails, если страница уже
+    подготовлена, иначе отдельным запросом к KV-хранилищу."""
+    primed = getattr(post, 'primed_thumbnails', {})
+    if preset in primed:
+        return primed[preset]
+    return cached_thumbnail(post.image, preset)
+
+
+def generate(post_id, image_name):
+    """Режет все миниатюры картинки и обновляет карточку поста."""
+    try:
+        # Через хранилище поля: от него зависит ключ миниатюры у sorl.
+        source = ImageFile(image_name, Post._meta.get_field('image').storage)
+        for geometry, options in presets.values():
+            get_thumbnail(source, geometry, **options)
+        post = Post.objects.filter(pk=post_id).first()
+        if post is not None and post.image.name == image_name:
+            post.save(update_fields=['card_version'])
+    except Exception:
+        logger.exception('Не удалось нарезать миниатюры %s', image_name)
+    finally:
+        cache.delete(JOB_PREFIX + image_name)
+
+
+def generate_in_worker(post_id, image_name):
+    generate(post_id, image_name)
+    close_old_connections()
+
+
+def process_pool(max_workers):
+    # spawn, а не fork: дочерний процесс не наследует соединения с БД
+    # и блокировки потоков веб-сервера.
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    )
+
+
+def _executor_instance():
+    global _executor
+    if _executor is None:
+        _executor = process_pool(workers())
+    return _executor
+
+
+def _submit(post_id, image_name):
+    if workers() > 0:
+        _executor_instance().submit(generate_in_worker, post_id, image_name)
+    else:
+        generate(post_id, image_name)
+
+
+def schedule(post):
+    """Ставит нарезку миниатюр поста в очередь после коммита."""
+    if not post.image or all(lookup(post, preset) for preset in presets):
+        return
+    image_name = post.image.name
+    if not cache.add(JOB_PREFIX + image_name, 1, job_timeout):
+        return
+    transaction.on_commit(lambda: _submit(post.pk, image_name))
@@ -0,0 +1,166 @@
+"""Нормализация картинок, загружаемых к постам.
+
+До полного декодирования проверяются размер файла и число пикселей из
+заголовка. Затем картинка поворачивается по EXIF, уменьшается до
+POST_IMAGE_MAX_EDGE по длинной стороне и пережимается в том же формате
+без метаданных. Если уменьшать, поворачивать и вычищать нечего, остаётся
+меньший из двух файлов: пережатие не всегда выигрывает у оригинала.
+Анимированные картинки только проверяются.
+
+Если задан POST_IMAGE_ORIGINALS_DIR, оригинал сохраняется туда (вне
+MEDIA_ROOT) как есть.
+"""
+import logging
+from collections import namedtuple
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+exif_orientation = 0x0112
+# Ключи Image.info с метаданными, которые вычищает пережатие.
+metadata_keys = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+
+# Параметры пережатия по форматам; метаданные в них не передаются.
+save_options = {
+    'JPEG': lambda quality: {
+        'quality': quality, 'optimize': True, 'progressive': True,
+    },
+    'WEBP': lambda quality: {'quality': quality, 'method': 6},
+    'PNG': lambda quality: {'optimize': True},
+    'GIF': lambda quality: {'optimize': True},
+}
+
+
+class UploadReport(namedtuple('UploadReport', (
+        'name', 'original_bytes', 'bytes', 'original_size', 'size',
+        'placeholder'))):
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - self.bytes
+
+
+def max_bytes():
+    return getattr(settings, 'POST_IMAGE_MAX_BYTES', 20 * 1024 * 1024)
+
+
+def max_pixels():
+    return getattr(settings, 'POST_IMAGE_MAX_PIXELS', 40 * 1000 * 1000)
+
+
+def max_edge():
+    return getattr(settings, 'POST_IMAGE_MAX_EDGE', 2048)
+
+
+def quality():
+    return getattr(settings, 'POST_IMAGE_QUALITY', 85)
+
+
+def originals_dir():
+    return getattr(settings, 'POST_IMAGE_ORIGINALS_DIR', None)
+
+
+def keep_original(upload):
+    """Копирует оригинал в холодное хранилище, читая его порциями."""
+    storage = FileSystemStorage(location=originals_dir())
+    upload.seek(0)
+    name = storage.save(
+        f'{timezone.now():%Y/%m/%d}/{upload.name}', upload)
+    upload.seek(0)
+    return name
+
+
+def placeholder_colour(image):
+    """Средний цвет картинки (#rrggbb) для фона до её загрузки."""
+    sample = image.convert('RGB')
+    sample.thumbnail((1, 1))
+    red, green, blue = sample.getpixel((0, 0))
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def describe_image(file_):
+    """(ширина, высота, цвет-заглушка) сохранённой картинки."""
+    with Image.open(file_) as image:
+        width, height = image.size
+        if image.getexif().get(exif_orientation) in (5, 6, 7, 8):
+            width, height = height, width
+        # Для цвета хватает JPEG, декодированного в малом масштабе.
+        image.draft('RGB', (64, 64))
+        return width, height, placeholder_colour(image)
+
+
+def _open(upload):
+    if upload.size > max_bytes():
+        raise ValidationError(
+            f'Файл больше {max_bytes() // (1024 * 1024)} МБ',
+            code='file_too_large')
+    upload.seek(0)
+    # Image.open читает только заголовок, пиксели ещё не декодированы.
+    image = Image.open(upload)
+    width, height = image.size
+    if width * height > max_pixels():
+        raise ValidationError(
+            f'Картинка больше {max_pixels()} пикселей', code='too_many_pixels')
+    return image
+
+
+def _carries_metadata(image):
+    return bool(image.getexif()) or any(
+        key in image.info for key in metadata_keys)
+
+
+def _shrink(image, edge):
+    if image.format == 'JPEG':
+        # JPEG можно декодировать сразу в уменьшенном масштабе.
+        image.draft(image.mode, (edge, edge))
+    icc_profile = image.info.get('icc_profile')
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((edge, edge), Image.LANCZOS)
+    return image, icc_profile
+
+
+def normalize_image(upload):
+    """Возвращает (нормализованный файл, UploadReport)."""
+    image = _open(upload)
+    original_size = image.size
+    if originals_dir():
+        keep_original(upload)
+    image_format = image.format
+    if getattr(image, 'is_animated', False) or (
+            image_format not in save_options):
+        placeholder = placeholder_colour(image)
+        upload.seek(0)
+        return upload, UploadReport(
+            upload.name, upload.size, upload.size, original_size,
+            original_size, placeholder)
+    untouched = (
+        max(original_size) <= max_edge() and not _carries_metadata(image))
+    image, icc_profile = _shrink(image, max_edge())
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    options = save_options[image_format](quality())
+    if icc_profile:
+        # Цветовой профиль не метаданные: без него сдвинутся цвета.
+        options['icc_profile'] = icc_profile
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **options)
+    data = buffer.getvalue()
+    if untouched and upload.size <= len(data):
+        upload.seek(0)
+        data = upload.read()
+        upload.seek(0)
+    report = UploadReport(
+        upload.name, upload.size, len(data), original_size, image.size,
+        placeholder_colour(image))
+    logger.info(
+        'Картинка %s: %s -> %s, %d -> %d байт (сэкономлено %d)',
+        report.name, report.original_size, report.size,
+        report.original_bytes, report.bytes, report.bytes_saved)
+    return SimpleUploadedFile(
+        upload.name, data, getattr(upload, 'content_type', None)), report
@@ -1,12 +1,233 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import heapq
+import itertools
+import math
+
+from django.core.paginator import EmptyPage, InvalidPage, Page, Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
 
 max_on_page: int = 10
+comments_on_page: int = 20
+# Старые ссылки вида ?page=N обслуживаются через OFFSET только
+# на первых страницах, дальше навигация идёт по курсору.
+legacy_page_limit: int = 5
+
+CURSOR_NEXT = 'n'
+CURSOR_PREV = 'p'
+
+
+def encode_cursor(direction, value, pk):
+    raw = f'{direction}|{value}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, parse=parse_datetime):
+    """Возвращает (direction, value, pk) или None для битого курсора.
+
+    parse превращает строку ключа обратно в значение, по умолчанию дату.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, value, pk = raw.split('|')
+        value = parse(value)
+        pk = int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+    if direction not in (CURSOR_NEXT, CURSOR_PREV) or value is None:
+        return None
+    return direction, value, pk
+
+
+class CursorPaginator(Paginator):
+    """Keyset-паджинатор по (pub_date, id) без COUNT(*) и OFFSET.
+
+    Общее число страниц неизвестно, поэтому num_pages описывает только
+    видимое окно: текущую страницу и наличие соседних. Курсоры соседних
+    страниц выдаются в page_obj.next_cursor и page_obj.previous_cursor.
+
+    key задаёт поля (дата, id) выборки, по которым идёт keyset, а related
+    позволяет листать, например, FeedEntry, показывая связанные посты.
+    Курсор строится по cursor_value() и pk объекта на странице, по
+    умолчанию по pub_date.
+    """
+
+    num_pages = None
+
+    def __init__(self, object_list, per_page,
+                 legacy_limit=legacy_page_limit,
+                 key=('pub_date', 'pk'), related=None):
+        self.date_field, self.pk_field = key
+        self.related = related
+        if object_list is not None:
+            object_list = object_list.order_by(
+                '-' + self.date_field, '-' + self.pk_field)
+        super().__init__(object_list, per_page)
+        self.legacy_limit = legacy_limit
+
+    def fetch(self, limit, offset=0, direction=CURSOR_NEXT, position=None):
+        """Строки окна в порядке обхода: по убыванию ключа для next и по
+        возрастанию для prev, начиная сразу за position."""
+        rows = self.object_list
+        if position is not None:
+            pub_date, pk = position
+            lookup = 'lt' if direction == CURSOR_NEXT else 'gt'
+            rows = rows.filter(
+                Q(**{f'{self.date_field}__{lookup}': pub_date})
+                | Q(**{self.date_field: pub_date,
+                       f'{self.pk_field}__{lookup}': pk})
+            )
+        if direction == CURSOR_PREV:
+            rows = rows.order_by(self.date_field, self.pk_field)
+        rows = list(rows[offset:offset + limit])
+        if self.related is not None:
+            rows = [getattr(row, self.related) for row in rows]
+        return rows
+
+    def cursor_value(self, obj):
+        return obj.pub_date.isoformat()
+
+    def parse_cursor_value(self, value):
+        return parse_datetime(value)
 
+    def get_cursor_page(self, cursor):
+        decoded = (
+            decode_cursor(cursor, self.parse_cursor_value) if cursor else None
+        )
+        if decoded is None:
+            return self._page_from_rows(CURSOR_NEXT)
+        direction, value, pk = decoded
+        return self._page_from_rows(direction, (value, pk))
 
-def get_page_context(post_list, request):
-    paginator = Paginator(post_list, max_on_page)
+    def get_legacy_page(self, number):
+        """Совместимость со ссылками ?page=N на первых страницах.
+
+        Номер дальше legacy_limit вызывает EmptyPage: иначе одна и та же
+        страница открывалась бы по любому ?page=N.
+        """
+        try:
+            number = self.validate_number(number)
+        except InvalidPage:
+            number = 1
+        if number > self.legacy_limit:
+            raise EmptyPage('Страница доступна только по курсору')
+        offset = (number - 1) * self.per_page
+        rows = self.fetch(self.per_page + 1, offset)
+        if not rows and number > 1:
+            # Как и Paginator.get_page, отдаём последнюю страницу,
+            # считая только ограниченный префикс выборки.
+            total = len(self.fetch(offset))
+            number = max(math.ceil(total / self.per_page), 1)
+            offset = (number - 1) * self.per_page
+            rows = self.fetch(self.per_page + 1, offset)
+        return self._make_page(rows[:self.per_page], number,
+                               has_next=len(rows) > self.per_page,
+                               has_previous=number > 1)
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise InvalidPage('Номер страницы не является числом')
+        if number < 1:
+            raise InvalidPage('Номер страницы меньше 1')
+        return number
+
+    def _page_from_rows(self, direction, position=None):
+        rows = self.fetch(self.per_page + 1, direction=direction,
+                          position=position)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        has_next, has_previous = has_more, position is not None
+        if direction == CURSOR_PREV:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        return self._make_page(rows, 1, has_next=has_next,
+                               has_previous=has_previous)
+
+    def _make_page(self, rows, number, has_next, has_previous):
+        # Для курсорных страниц номер условный: 2, если есть предыдущая.
+        if has_previous and number < 2:
+            number = 2
+        self.num_pages = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        page.next_cursor = (
+            encode_cursor(CURSOR_NEXT, self.cursor_value(rows[-1]),
+                          rows[-1].pk)
+            if has_next else None
+        )
+        page.previous_cursor = (
+            encode_cursor(CURSOR_PREV, self.cursor_value(rows[0]),
+                          rows[0].pk)
+            if has_previous else None
+        )
+        return page
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Листает сразу несколько упорядоченных выборок постов.
+
+    Каждая выборка задаётся своим CursorPaginator; окно страницы
+    собирается k-way слиянием их окон по (pub_date, pk).
+    """
+
+    def __init__(self, sources, per_page, legacy_limit=legacy_page_limit):
+        self.sources = sources
+        super().__init__(None, per_page, legacy_limit)
+
+    def fetch(self, limit, offset=0, direction=CURSOR_NEXT, position=None):
+        streams = [
+            source.fetch(limit + offset, direction=direction,
+                         position=position)
+            for source in self.sources
+        ]
+        merged = heapq.merge(
+            *streams,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=direction == CURSOR_NEXT,
+        )
+        return list(itertools.islice(merged, offset, offset + limit))
+
+
+def get_page_context(post_list, request, **kwargs):
+    """Контекст страницы ленты.
+
+    post_list может быть выборкой постов или уже готовым паджинатором,
+    например MergedCursorPaginator.
+    """
+    if isinstance(post_list, CursorPaginator):
+        paginator = post_list
+    else:
+        paginator = CursorPaginator(post_list, max_on_page, **kwargs)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if page_number is not None and 'cursor' not in request.GET:
+        try:
+            page_obj = paginator.get_legacy_page(page_number)
+        except EmptyPage:
+            raise Http404
+    else:
+        page_obj = paginator.get_cursor_page(request.GET.get('cursor'))
     return {
         'page_obj': page_obj,
     }
+
+
+def get_comments_page(comments, cursor):
+    """Порция комментариев от новых к старым с авторами за один запрос;
+    следующая порция — по page.next_cursor."""
+    paginator = CursorPaginator(
+        comments.select_related('author'), comments_on_page)
+    return paginator.get_cursor_page(cursor)
+
+
+def page_cache_tags(page_obj):
+    """Теги кэша для страницы ленты: авторы и группы её постов."""
+    tags = set()
+    for post in page_obj:
+        tags.add(f'author:{post.author_id}')
+        if post.group_id:
+            tags.add(f'group:{post.group_id}')
+    return tuple(sorted(tags))
@@ -1,61 +1,168 @@
+import hashlib
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import (
+    FileResponse, Http404, HttpResponse, StreamingHttpResponse,
+)
 from django.shortcuts import render, get_object_or_404, redirect
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import etag
 from .models import Post, Group, User, Follow
 from django.contrib.auth.decorators import login_required
 from .forms import PostForm, CommentForm
-from .utils import get_page_context
-from django.views.decorators.cache import cache_page
+from .utils import get_comments_page, get_page_context, page_cache_tags
+from .search import SearchPaginator
+from . import export, feed, resize, thumbnails
+from .counters import get_counters
+from core import tagged_cache
+from core.tagged_cache import cache_tagged_page, tag_response, tags_etag
+
+
+def _lookup_id(request, model, **lookup):
+    # id нужен и ETag, и тегам кэша страницы; ищем его один раз за запрос.
+    found = request.__dict__.setdefault('_tag_ids', {})
+    key = (model, *lookup.items())
+    if key not in found:
+        found[key] = (
+            model.objects.filter(**lookup)
+            .values_list('pk', flat=True).first()
+        )
+    return found[key]
+
+
+# Теги страниц группы и профиля строятся по id: slug и username могут
+# смениться и не годятся в ключ memcached.
+def group_tags(request, slug):
+    # id по slug берётся из кэша, чтобы ответ 304 по ETag обходился без
+    # запросов к базе; запись устаревает с тегом groups.
+    key = 'group_id:' + hashlib.md5(slug.encode()).hexdigest()
+    group_id = tagged_cache.get(key)
+    if group_id is None:
+        group_id = _lookup_id(request, Group, slug=slug)
+        if group_id is None:
+            return []
+        tagged_cache.put(key, group_id, ['groups'],
+                         settings.PAGE_CACHE_TIMEOUT)
+    return [f'group:{group_id}']
+
+
+def profile_tags(request, username):
+    user_id = _lookup_id(request, User, username=username)
+    return [] if user_id is None else [f'profile:{user_id}']
+
+
+# ETag считается по версиям тегов кэша до любых запросов к постам, так что
+# повторный визит без изменений получает 304 без рендера. Теги authors и
+# groups сбрасываются при переименовании автора или группы.
+def index_etag(request):
+    return tags_etag(request, ['feed:index', 'authors', 'groups'])
+
+
+def group_etag(request, slug):
+    tags = group_tags(request, slug)
+    if not tags:
+        return None
+    return tags_etag(request, [*tags, 'authors'])
 
 
-@cache_page(20, key_prefix="index_page")
+def profile_etag(request, username):
+    tags = profile_tags(request, username)
+    if not tags:
+        return None
+    return tags_etag(request, [*tags, 'authors', 'groups'])
+
+
+def post_etag(request, post_id):
+    author_id = (
+        Post.objects.filter(pk=post_id)
+        .values_list('author_id', flat=True).first()
+    )
+    if author_id is None:
+        return None
+    return tags_etag(request, [
+        f'post:{post_id}', f'profile:{author_id}', 'authors', 'groups',
+    ])
+
+
+@tagged_cache.etag(index_etag)
+@cache_tagged_page(settings.PAGE_CACHE_TIMEOUT, key_prefix='index_page',
+                   tags=lambda request: ['feed:index'])
 def index(request):
 
     template = 'posts/index.html'
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed()
     context = get_page_context(post_list, request)
-    return render(request, template, context)
+    response = render(request, template, context)
+    return tag_response(response, *page_cache_tags(context['page_obj']))
 
 
 # Страница с постами, отфильтрованными по группам
+@tagged_cache.etag(group_etag)
+@cache_tagged_page(settings.PAGE_CACHE_TIMEOUT, key_prefix='group_page',
+                   tags=group_tags)
 def group_posts(request, slug):
     template = 'posts/group_list.html',
     group = get_object_or_404(Group, slug=slug)
-    post_list = (Post.objects.filter
-                 (group=group))
+    post_list = Post.objects.for_feed().filter(group=group)
     context = {
         'group': group
     }
     context.update(get_page_context(post_list, request))
-    return render(request, template, context)
+    response = render(request, template, context)
+    return tag_response(response, *page_cache_tags(context['page_obj']))
 
 
+@tagged_cache.etag(profile_etag)
+@cache_tagged_page(settings.PAGE_CACHE_TIMEOUT, key_prefix='profile_page',
+                   tags=profile_tags)
 def profile(request, username):
     template = 'posts/profile.html'
-    user = User.objects.get(username=username)
-    post_list = (Post.objects.filter
-                 (author=user))
+    user = User.objects.select_related('counters').get(username=username)
+    post_list = Post.objects.for_feed().filter(author=user)
     following = request.user.is_authenticated and (
         request.user.follower.filter(author=user).exists()
     )
     context = {
         'author': user,
+        'counters': get_counters(user),
         'following': following
     }
     context.update(get_page_context(post_list, request))
-    return render(request, template, context)
+    response = render(request, template, context)
+    return tag_response(response, *page_cache_tags(context['page_obj']))
 
 
+@etag(post_etag)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.for_detail(), id=post_id)
     form = CommentForm()
     context = {
         'post': post,
+        'author_counters': get_counters(post.author),
+        'comments': get_comments_page(
+            post.comments, request.GET.get('cursor')),
         'form': form,
         'switched_to_post_detail': True
     }
     return render(request, template, context)
 
 
+@etag(post_etag)
+def post_comments(request, post_id):
+    """Следующая порция комментариев HTML-фрагментом для «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    context = {
+        'post': post,
+        'comments': get_comments_page(
+            post.comments, request.GET.get('cursor')),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
 def post_create(request):
 
@@ -66,6 +173,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post)
         return redirect('posts:profile', username=post.author)
 
     return render(request, template,
@@ -83,7 +191,8 @@ def post_edit(request, post_id):
                         files=request.FILES or None,
                         instance=post)
         if form.is_valid():
-            form.save()
+            post = form.save()
+            thumbnails.schedule(post)
             return redirect('posts:post_detail', post_id=post.id)
         return render(request, template,
                       {'form': form, 'username': request.user,
@@ -102,9 +211,19 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def post_search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query
+    }
+    context.update(get_page_context(SearchPaginator(query), request))
+    return render(request, template, context)
+
+
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
+    post_list = feed.get_feed(request.user)
     template = 'posts/follow.html'
     context = {
         'follow': True
@@ -130,3 +249,55 @@ def profile_unfollow(request, username):
     if followed.exists():
         followed.delete()
     return redirect('posts:profile', username=username)
+
+
+def resized_image(request, signature, geometry, name):
+    """Картинка из media в размере geometry по подписанной ссылке."""
+    if not resize.check_signature(signature, geometry, name):
+        raise Http404
+    try:
+        relative = resize.get_resized(name, geometry)
+    except (resize.ResizeError, OSError):
+        raise Http404
+    content_type, _ = mimetypes.guess_type(relative)
+    header = getattr(settings, 'RESIZE_SENDFILE_HEADER', None)
+    if header == 'X-Accel-Redirect':
+        response = HttpResponse(content_type=content_type)
+        response[header] = (
+            settings.RESIZE_SENDFILE_PREFIX + relative.replace(os.sep, '/'))
+    elif header:
+        response = HttpResponse(content_type=content_type)
+        response[header] = os.path.join(resize.cache_dir(), relative)
+    else:
+        path = os.path.join(resize.cache_dir(), relative)
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    patch_cache_control(response, public=True, max_age=60 * 60 * 24 * 30)
+    return response
+
+
+def _export_response(request, content):
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in export.content_types:
+        raise Http404
+    response = StreamingHttpResponse(
+        export.stream(content, export_format,
+                      images=request.GET.get('images') == '1'),
+        content_type=export.content_types[export_format],
+    )
+    response['Content-Disposition'] = export.content_disposition(
+        content, export_format)
+    return response
+
+
+@login_required
+def export_content(request):
+    """Выгрузка своих постов и комментариев: ?format=ndjson|zip&images=1."""
+    return _export_response(request, export.user_export(request.user))
+
+
+@login_required
+def group_export(request, slug):
+    if not request.user.is_staff:
+        raise PermissionDenied
+    group = get_object_or_404(Group, slug=slug)
+    return _export_response(request, export.group_export(group))
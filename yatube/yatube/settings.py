@@ -139,8 +139,62 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Небольшой LRU в каждом процессе перед общим для всех воркеров файловым
+# кэшем (core.cache_backends.TwoLevelCache и SharedFileCache).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache_backends.TwoLevelCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 60,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.SharedFileCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'CULL_INTERVAL': 100,
+        },
+    },
 }
+
+# Авторы с таким числом подписчиков не раскладываются по лентам
+# (push), а подмешиваются в ленту при чтении (pull). Обратно на push
+# автора переводит rebuild_feeds, когда подписчиков меньше второго порога.
+FEED_FANOUT_THRESHOLD = 1000
+FEED_FANOUT_DEMOTE_THRESHOLD = 800
+
+# Сколько последних постов автора попадает в ленту при подписке.
+FEED_BACKFILL_POSTS = 200
+
+# Сколько живёт отрендеренная карточка поста в кэше, секунд.
+POST_CARD_CACHE_TIMEOUT = 60 * 60
+
+# Страницы лент инвалидируются по тегам (core.tagged_cache), поэтому
+# их можно держать в кэше долго.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Сколько процессов режут миниатюры картинок постов; 0 — резать в том же
+# процессе сразу после сохранения поста.
+THUMBNAIL_WORKERS = 2
+
+# Загружаемые картинки постов (posts.uploads): пределы до декодирования,
+# длинная сторона и качество после пережатия, каталог для оригиналов
+# (None — не хранить).
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POST_IMAGE_MAX_EDGE = 2048
+POST_IMAGE_QUALITY = 85
+POST_IMAGE_ORIGINALS_DIR = None
+
+# Картинки по подписанным ссылкам /media/r/... (posts.resize): каталог и
+# предельный размер дискового кэша, наибольшая сторона. Заголовок
+# X-Accel-Redirect или X-Sendfile передаёт отдачу файла веб-серверу
+# (для X-Accel-Redirect — по внутреннему пути RESIZE_SENDFILE_PREFIX).
+RESIZE_CACHE_DIR = os.path.join(BASE_DIR, 'resized')
+RESIZE_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+RESIZE_MAX_EDGE = 2048
+RESIZE_SENDFILE_HEADER = None
+RESIZE_SENDFILE_PREFIX = '/internal/resized/'
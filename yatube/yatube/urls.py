@@ -3,12 +3,18 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from posts.views import resized_image
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('about/', include('about.urls', namespace='about')),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls', namespace='users')),
-    path('auth/', include('django.contrib.auth.urls'))
+    path('auth/', include('django.contrib.auth.urls')),
+    # До раздачи media в DEBUG, которая перехватила бы этот путь.
+    path(settings.MEDIA_URL.lstrip('/')
+         + 'r/<str:signature>/<str:geometry>/<path:name>',
+         resized_image, name='resized_image'),
 ]
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'